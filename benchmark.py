@@ -0,0 +1,483 @@
+
+'''Performance benchmarks, run with "python benchmark.py [name ...]"'''
+
+import json
+import os
+import shutil
+import sys
+import tracemalloc
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame as pg  # noqa: E402
+
+from gui.bundle import Bundle  # noqa: E402
+from gui.files import cache_dir, image_dir, init_dirs  # noqa: E402
+from gui.controller.creature import CreatureController  # noqa: E402
+from gui.menu.encounter import Encounter  # noqa: E402
+from gui.screen import Screen  # noqa: E402
+from gui.utils.atlas import SpriteAtlas  # noqa: E402
+from gui.utils.image import ImageUtils  # noqa: E402
+from gui.utils.loader import SpriteLoader  # noqa: E402
+from gui.utils.spritecache import SpriteCache  # noqa: E402
+from gui.utils.tiles import TilePyramid  # noqa: E402
+from gui.view.entity import EntityView  # noqa: E402
+
+EXAMPLES_DIR = Path(__file__).parent.joinpath('examples')
+BACKGROUND_SIZE = (3840, 2160)
+MIN_UNITS = 24
+FRAMES = 60
+
+
+def make_image(folder: Path, name: str, size: tuple[int, int]) -> Path:
+    rng = Random(name)
+    surf = pg.Surface(size)
+    surf.fill([rng.randrange(256) for _ in range(3)])
+    for _ in range(20):
+        pg.draw.circle(
+            surf, [rng.randrange(256) for _ in range(3)],
+            (rng.randrange(size[0]), rng.randrange(size[1])),
+            rng.randrange(1, max(size) // 4 + 2))
+    path = folder.joinpath(name)
+    pg.image.save(surf, path)
+    return path
+
+
+def encounter_data(
+        folder: Path, n_entities: int, n_images: int = 4,
+        token_size: tuple[int, int] = (256, 256)) -> dict:
+    rng = Random(n_entities)
+    bg = make_image(folder, 'background.png', BACKGROUND_SIZE)
+    images = [
+        make_image(folder, f'token{i}.png', token_size)
+        for i in range(n_images)]
+    cols = MIN_UNITS * BACKGROUND_SIZE[0] // BACKGROUND_SIZE[1]
+
+    creatures = [{
+        'img': str(rng.choice(images)),
+        'x': rng.randrange(cols), 'y': rng.randrange(MIN_UNITS),
+        'team': rng.choice(('none', 'ally', 'enemy')),
+    } for _ in range(n_entities)]
+
+    return {
+        'creatures': creatures,
+        'items': [],
+        'background': {'img': str(bg)},
+        'min_units': MIN_UNITS,
+    }
+
+
+def example_data(example: Path, n_entities: int) -> dict:
+    '''Example encounter with n_entities, images made in the image dir'''
+    with example.open('r') as f:
+        data = json.load(f)
+    rng = Random(example.name)
+
+    def image(element: dict, size: tuple[int, int]):
+        name = element['img'].replace('\\', '/')
+        path = image_dir().joinpath(name)
+        if not path.is_file():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            make_image(path.parent, path.name, size)
+        element['img'] = name
+
+    image(data['background'], BACKGROUND_SIZE)
+    w, h = BACKGROUND_SIZE
+    cols = data['min_units'] * w // h
+    elements = data['creatures'] + data['items']
+    for element in elements:
+        image(element, (512, 512))
+
+    # The same creatures and items repeated over the whole map
+    for kind in ('creatures', 'items'):
+        originals = data[kind]
+        share = round(n_entities * len(originals) / len(elements))
+        data[kind] = [
+            originals[i % len(originals)] | {
+                'x': rng.randrange(cols),
+                'y': rng.randrange(data['min_units'])}
+            for i in range(share)]
+    return data
+
+
+def timed(function, frames: int = FRAMES) -> float:
+    '''Average milliseconds per call'''
+    start = perf_counter()
+    for i in range(frames):
+        function(i)
+    return (perf_counter() - start) / frames * 1000
+
+
+def settle(screen: Screen):
+    '''Show frames until every sprite is loaded'''
+    screen.show()
+    while screen.encounter.poll_loading():
+        sleep(0.001)
+        screen.show()
+    screen.show()
+
+
+def clear_caches(disk: bool = True):
+    '''Empty the memory caches, and the sprites on disk if disk'''
+    ImageUtils._cache.clear()
+    EntityView._sprites.clear()
+    TilePyramid._tiles.clear()
+    if disk:
+        SpriteCache.clear()
+
+
+def bench_drag(counts=(10, 100, 1000, 5000)):
+    '''Frame time while dragging the ghost of the selected entity'''
+    print(f'{"entities":>10} {"dirty (ms)":>12} {"full (ms)":>12}')
+    for n in counts:
+        with TemporaryDirectory() as tmp:
+            screen = Screen.from_dict(encounter_data(Path(tmp), n))
+            encounter = screen.encounter
+            encounter.select_entity(encounter.entities[-1])
+            screen.input.clicking = (True, False)
+            settle(screen)
+
+            w, h = encounter.get_size()
+
+            def drag(i: int):
+                screen.input.mousepos = (
+                    w // 4 + i * 7 % (w // 2), h // 4 + i * 5 % (h // 2))
+                screen.show()
+
+            def drag_full(i: int):
+                encounter.dirty.invalidate()
+                drag(i)
+
+            dirty = timed(drag)
+            full = timed(drag_full, FRAMES // 4)
+        print(f'{n:>10} {dirty:>12.2f} {full:>12.2f}')
+
+
+def bench_grid(min_units=(8, 32, 128, 512)):
+    '''Redraw time of a single token step with the grid visible'''
+    print(f'{"min_units":>10} {"step (ms)":>12} {"rebuild (ms)":>12}')
+    for mu in min_units:
+        with TemporaryDirectory() as tmp:
+            data = encounter_data(Path(tmp), 100)
+            data['min_units'] = mu
+            screen = Screen.from_dict(data)
+            encounter = screen.encounter
+            encounter.switch_grid_visibility()
+            entity = encounter.entities[0]
+            settle(screen)
+
+            def step(i: int):
+                if i % 2:
+                    encounter.move_entity_left(entity)
+                else:
+                    encounter.move_entity_right(entity)
+                screen.show()
+
+            def rebuild(i: int):
+                encounter.invalidate_static_layer()
+                screen.show()
+
+            step_time = timed(step)
+            rebuild_time = timed(rebuild, FRAMES // 4)
+        print(f'{mu:>10} {step_time:>12.2f} {rebuild_time:>12.2f}')
+
+
+def bench_status(counts=(30, 300)):
+    '''Time to cycle the status of every creature and redraw'''
+    print(f'{"entities":>10} {"cycle (ms)":>12}')
+    for n in counts:
+        with TemporaryDirectory() as tmp:
+            screen = Screen.from_dict(encounter_data(Path(tmp), n))
+            encounter = screen.encounter
+            settle(screen)
+
+            def cycle(i: int):
+                for entity in encounter.entities:
+                    encounter.change_creature_status(entity)
+                settle(screen)
+
+            cycle_time = timed(cycle, 9)
+        print(f'{n:>10} {cycle_time:>12.2f}')
+
+
+def bench_load(counts=(40, 400)):
+    '''Time to the first frame and to every sprite loaded'''
+    print(
+        f'{"entities":>10} {"mode":>8} '
+        f'{"first (ms)":>12} {"complete (ms)":>14}')
+    for n in counts:
+        with TemporaryDirectory() as tmp:
+            data = encounter_data(Path(tmp), n, n // 4, (1024, 1024))
+            # The last one starts like the next session, sprites on disk
+            modes = (
+                ('serial', False, True),
+                ('threads', True, True),
+                ('disk', True, False),
+            )
+            for mode, enabled, disk in modes:
+                SpriteLoader.enabled = enabled
+                clear_caches(disk)
+
+                start = perf_counter()
+                screen = Screen(Encounter.from_dict(data))
+                screen.show()
+                first = perf_counter() - start
+                settle(screen)
+                complete = perf_counter() - start
+
+                print(
+                    f'{n:>10} {mode:>8} '
+                    f'{first * 1000:>12.1f} {complete * 1000:>14.1f}')
+
+
+def bench_bundle(counts=(100, 500)):
+    '''Open time of the examples as JSON against as a bundle
+
+    Cold opens start without the cache directory, so the JSON ones
+    build the background tiles and the bundle ones extract them.
+    '''
+    print(
+        f'{"example":>12} {"entities":>9} {"mode":>12} '
+        f'{"first (ms)":>11} {"complete (ms)":>14}')
+    for example in sorted(EXAMPLES_DIR.glob('*.json')):
+        for n in counts:
+            data = example_data(example, n)
+            text = json.dumps(data)
+            screen = Screen(Encounter.from_dict(data))
+            settle(screen)
+            bundle = cache_dir().parent.joinpath(f'{example.stem}.encb')
+            Bundle.save(screen.encounter, bundle)
+
+            opens = {
+                'json': lambda: Encounter.from_dict(json.loads(text)),
+                'bundle': lambda: Bundle.load(bundle),
+            }
+            for mode, open_encounter in opens.items():
+                for cold in (True, False):
+                    if cold:
+                        shutil.rmtree(cache_dir(), ignore_errors=True)
+                    clear_caches()
+
+                    start = perf_counter()
+                    screen = Screen(open_encounter())
+                    screen.show()
+                    first = perf_counter() - start
+                    settle(screen)
+                    complete = perf_counter() - start
+
+                    label = f'{mode} (cold)' if cold else mode
+                    print(
+                        f'{example.stem:>12} {n:>9} {label:>12} '
+                        f'{first * 1000:>11.1f} {complete * 1000:>14.1f}')
+
+
+def bench_cull(counts=(1000, 5000)):
+    '''Full redraw time with most entities outside the zoomed view'''
+    print(
+        f'{"entities":>10} {"zoom":>5} {"full (ms)":>10} '
+        f'{"drawn":>7} {"culled":>7}')
+    for n in counts:
+        with TemporaryDirectory() as tmp:
+            screen = Screen.from_dict(encounter_data(Path(tmp), n))
+            encounter = screen.encounter
+            for steps in (0, 8):
+                encounter.zoom(steps, 0, 0)
+                settle(screen)
+
+                def redraw(i: int):
+                    encounter.dirty.invalidate()
+                    screen.show()
+
+                full = timed(redraw, FRAMES // 4)
+                stats = encounter.render_stats()
+                print(
+                    f'{n:>10} {encounter.camera.zoom:>5.1f} {full:>10.2f} '
+                    f'{stats["drawn"]:>7} {stats["culled"]:>7}')
+
+
+def bench_blits(counts=(100, 1000, 5000)):
+    '''Entity drawing time, one blit per entity against batched blits'''
+    print(
+        f'{"entities":>10} {"single (ms)":>12} {"blits (ms)":>11} '
+        f'{"atlas (ms)":>11}')
+    for n in counts:
+        with TemporaryDirectory() as tmp:
+            screen = Screen.from_dict(encounter_data(Path(tmp), n))
+            encounter = screen.encounter
+            # Whole map in view
+            encounter.zoom(-4, 0, 0)
+            settle(screen)
+            window = screen._precalc
+            cell_size = encounter.get_display_cell_size()
+            origin = encounter.camera.origin
+            visible = encounter.get_visible_entities([window.get_rect()])
+            atlas = SpriteAtlas()
+
+            def single(i: int):
+                for e in visible:
+                    window.blit(*e.get_blit(cell_size, origin))
+
+            def batch(i: int):
+                window.blits(
+                    [e.get_blit(cell_size, origin) for e in visible], False)
+
+            def packed(i: int):
+                window.blits(atlas.pack(
+                    [e.get_blit(cell_size, origin) for e in visible]), False)
+
+            single_time = timed(single)
+            batch_time = timed(batch)
+            atlas_time = timed(packed)
+        print(
+            f'{n:>10} {single_time:>12.2f} {batch_time:>11.2f} '
+            f'{atlas_time:>11.2f}')
+
+
+def bench_table(n: int = 10000):
+    '''Whole map operations with and without the EntityTable'''
+    print(
+        f'{"mode":>8} {"home (ms)":>10} {"area (us)":>10} '
+        f'{"view (ms)":>10}')
+    with TemporaryDirectory() as tmp:
+        data = encounter_data(Path(tmp), n)
+        rng = Random(n)
+        # Half of them out of the grid
+        for creature in data['creatures'][::2]:
+            creature['x'] += rng.randrange(100)
+            creature['y'] += rng.randrange(100)
+
+        for use_table in (False, True):
+            Encounter.USE_TABLE = use_table
+            encounter = Encounter.from_dict(data)
+            view = [pg.Rect((0, 0), encounter.camera.view_size)]
+            small = [pg.Rect(100, 100, 120, 120)]
+
+            def home(i: int):
+                encounter.bring_all_home()
+                encounter.undo()
+
+            def area(i: int):
+                encounter.get_visible_entities(small)
+
+            def visible(i: int):
+                encounter.get_visible_entities(view)
+
+            home_time = timed(home, 5)
+            area_time = timed(area, 1000) * 1000
+            view_time = timed(visible, 20)
+            mode = 'table' if encounter.table is not None else 'python'
+            print(
+                f'{mode:>8} {home_time:>10.1f} {area_time:>10.1f} '
+                f'{view_time:>10.2f}')
+    Encounter.USE_TABLE = True
+
+
+def bench_memory(n: int = 10000):
+    '''Memory allocated per entity, controllers alone and in an encounter'''
+    print(f'{"entities":>10} {"entity (B)":>11} {"encounter (B)":>14}')
+    with TemporaryDirectory() as tmp:
+        data = encounter_data(Path(tmp), n)
+        creatures = Encounter._resolve_images(data['creatures'])
+        data['creatures'] = creatures
+
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        entities = [CreatureController.from_dict(c) for c in creatures]
+        entity = tracemalloc.get_traced_memory()[0] - start
+        del entities
+
+        start = tracemalloc.get_traced_memory()[0]
+        encounter = Encounter.from_dict(data)
+        whole = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        del encounter
+    print(f'{n:>10} {entity / n:>11.0f} {whole / n:>14.0f}')
+
+
+def bench_background(sizes=((4096, 4096), (8192, 8192))):
+    '''Background open and frame times against scaling the whole image'''
+    print(
+        f'{"size":>12} {"build (ms)":>11} {"open (ms)":>10} '
+        f'{"first (ms)":>11} {"pan (ms)":>9} {"zoom (ms)":>10} '
+        f'{"whole (ms)":>11}')
+    for size in sizes:
+        with TemporaryDirectory() as tmp:
+            data = encounter_data(Path(tmp), 10)
+            data['background']['img'] = str(
+                make_image(Path(tmp), 'huge.png', size))
+            clear_caches()
+
+            start = perf_counter()
+            screen = Screen(Encounter.from_dict(data))
+            build = perf_counter() - start
+            encounter = screen.encounter
+            settle(screen)
+
+            start = perf_counter()
+            Encounter.from_dict(data)
+            reopen = perf_counter() - start
+
+            # Like the next session, the tiles only on disk
+            clear_caches(False)
+            start = perf_counter()
+            Screen(Encounter.from_dict(data)).show()
+            first = perf_counter() - start
+            screen.show()
+
+            def pan(i: int):
+                encounter.pan(37 if i % 20 < 10 else -37, 23)
+                screen.show()
+
+            def zoom(i: int):
+                encounter.zoom(-1 if i % 16 < 8 else 1, 0, 0)
+                screen.show()
+
+            def whole(i: int):
+                # Previous approach, every zoom level scaled the image
+                ImageUtils.scale(
+                    ImageUtils.load(Path(data['background']['img'])),
+                    0.5 ** (i % 4 + 1))
+
+            pan_time = timed(pan)
+            zoom_time = timed(zoom, 32)
+            whole_time = timed(whole, 4)
+        print(
+            f'{size[0]:>5}x{size[1]:<6} {build * 1000:>11.1f} '
+            f'{reopen * 1000:>10.1f} {first * 1000:>11.1f} '
+            f'{pan_time:>9.2f} {zoom_time:>10.2f} '
+            f'{whole_time:>11.1f}')
+
+
+BENCHMARKS = {
+    'drag': bench_drag,
+    'grid': bench_grid,
+    'status': bench_status,
+    'load': bench_load,
+    'bundle': bench_bundle,
+    'cull': bench_cull,
+    'blits': bench_blits,
+    'table': bench_table,
+    'memory': bench_memory,
+    'background': bench_background,
+}
+
+
+def main(names: list[str]):
+    with TemporaryDirectory() as home:
+        # Keep the generated caches out of the user directory
+        init_dirs(Path(home))
+        Screen.init()
+        try:
+            for name in names or BENCHMARKS:
+                print(f'# {name}')
+                BENCHMARKS[name]()
+        finally:
+            Screen.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
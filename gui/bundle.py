@@ -0,0 +1,188 @@
+
+import json
+import os
+import re
+from copy import copy
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pygame as pg
+
+from gui.files import image_dir, search_image
+from gui.menu.encounter import Encounter
+from gui.model.base import BaseModel
+from gui.utils.image import ImageUtils
+from gui.utils.tiles import TilePyramid
+from gui.values import CreatureStatus, CreatureTeam, ImageShape
+from gui.view.background import BackgroundView
+from gui.view.entity import EntityView
+
+# Types of the sprite_key values after the image, see the entity views
+_PARAM_TYPES = (float, ImageShape, CreatureStatus, CreatureTeam)
+
+
+class Bundle:
+    '''Encounter in a single archive, with what is drawn from its images
+
+    Besides the encounter and its images, it holds the sprites as raw
+    pixels and the background tiles for the saved scale. Opening it
+    neither decodes nor scales the images drawn at first. The images
+    keep their names: the missing ones are written to the images
+    directory and the ones found there with other contents are used
+    instead, without the sprites and tiles of the bundle.
+    '''
+    MANIFEST = 'bundle.json'
+    IMAGES = 'images'
+    SPRITES = 'sprites'
+    TILES = 'tiles'
+    # Names of the members written by save, no other is extracted
+    IMAGE_NAME = re.compile(r'\d+(\.\w+)?')
+    TILE_NAME = re.compile(
+        rf'\d+-[0-9a-f]+{re.escape(TilePyramid.LEVEL_EXTENSION)}|'
+        rf'{re.escape(TilePyramid.META_FILENAME)}')
+
+    @staticmethod
+    def save(encounter: Encounter, path: Path):
+        '''Write the encounter, drawing the sprites that are not ready'''
+        members: dict[Path, str] = dict()
+        # Name of the image of every member, as in the encounter
+        images: dict[str, str] = dict()
+
+        def member(model: BaseModel) -> str:
+            source = ImageUtils.image_key(model.image_path)[0]
+            name = members.get(source)
+            if name is None:
+                name = f'{Bundle.IMAGES}/{len(members)}{source.suffix}'
+                members[source] = name
+                images[name] = str(model.get_image_path())
+            return name
+
+        background = encounter.background
+        # At the cell size of a camera without zoom, which is not saved
+        cell_size = encounter.get_cell_size()
+        sprites: dict[tuple, tuple[str, pg.Surface]] = dict()
+        for entity in encounter.saved_order():
+            view = copy(entity.view)
+            view.set_base_size(cell_size)
+            key = view.sprite_key()
+            if key not in sprites:
+                sprites[key] = member(entity.model), view.get_surface()
+
+        pyramid = background.view.get_pyramid()
+        tiles = pyramid.cached_files(
+            pyramid.level_for(background.model.scale))
+
+        manifest = {
+            'encounter': encounter.to_dict(),
+            'images': images,
+            'background': member(background.model),
+            'sprites': [{
+                'img': name,
+                'params': [getattr(v, 'value', v) for v in key[1:]],
+                'size': surface.get_size(),
+            } for key, (name, surface) in sprites.items()],
+            'tiles': [tile.name for tile in tiles],
+        }
+
+        # Images are compressed already and pixels are read faster raw
+        tmp = path.with_name(f'.{path.name}.tmp')
+        try:
+            with ZipFile(tmp, 'w') as bundle:
+                bundle.writestr(
+                    Bundle.MANIFEST, json.dumps(manifest),
+                    compress_type=ZIP_DEFLATED)
+                for source, name in members.items():
+                    bundle.write(source, name)
+                for i, (_, surface) in enumerate(sprites.values()):
+                    bundle.writestr(
+                        f'{Bundle.SPRITES}/{i}.rgba',
+                        pg.image.tobytes(surface, 'RGBA'))
+                for tile in tiles:
+                    bundle.write(tile, f'{Bundle.TILES}/{tile.name}')
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    @staticmethod
+    def load(path: Path) -> Encounter:
+        with ZipFile(path) as bundle:
+            manifest = json.loads(bundle.read(Bundle.MANIFEST))
+            # Image files with the contents of the bundle
+            images = {
+                member: Bundle._restore_image(bundle, member, name)
+                for member, name in manifest['images'].items()}
+
+            background = images[manifest['background']]
+            if background is not None:
+                Bundle._extract_tiles(bundle, manifest, background)
+
+            for i, sprite in enumerate(manifest['sprites']):
+                image = images[sprite['img']]
+                if image is None:
+                    continue
+                surface = pg.image.frombuffer(
+                    bundle.read(f'{Bundle.SPRITES}/{i}.rgba'),
+                    sprite['size'], 'RGBA').convert_alpha()
+                params = tuple(
+                    t(v) for t, v in zip(_PARAM_TYPES, sprite['params']))
+                EntityView.preload_sprite(
+                    (ImageUtils.image_key(image),) + params, surface)
+
+        return Encounter.from_dict(manifest['encounter'])
+
+    @staticmethod
+    def _member_path(folder: Path, name: str, pattern: re.Pattern) -> Path:
+        '''Path of a member under folder, refusing names save never writes'''
+        path = folder.joinpath(name)
+        if (Path(name).name != name or not pattern.fullmatch(name)
+                or not path.resolve().is_relative_to(folder.resolve())):
+            raise ValueError(f'Invalid member name in the bundle: {name!r}')
+        return path
+
+    @staticmethod
+    def _restore_image(bundle: ZipFile, member: str, name: str) -> Path | None:
+        '''The image called name, None if found with other contents'''
+        Bundle._member_path(
+            Path(Bundle.IMAGES), member.removeprefix(f'{Bundle.IMAGES}/'),
+            Bundle.IMAGE_NAME)
+        contents = bundle.read(member)
+
+        found = search_image(name)
+        if found is not None:
+            found = image_dir().joinpath(found)
+            same = (
+                found.stat().st_size == len(contents)
+                and found.read_bytes() == contents)
+            return found if same else None
+
+        # Images from outside the images directory go right under it
+        relative = Path(name)
+        if relative.is_absolute() or '..' in relative.parts:
+            relative = Path(relative.name)
+        path = image_dir().joinpath(relative)
+        if image_dir().resolve() not in path.resolve().parents:
+            raise ValueError(f'Invalid image name in the bundle: {name!r}')
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'.{path.name}.tmp')
+        tmp.write_bytes(contents)
+        os.replace(tmp, path)
+        return path
+
+    @staticmethod
+    def _extract_tiles(bundle: ZipFile, manifest: dict, background: Path):
+        '''Tiles where the pyramid of the background looks for them'''
+        tiles = TilePyramid.folder_for(
+            background, BackgroundView.tiles_root())
+        # The levels are used once the meta file is there
+        names = sorted(
+            manifest['tiles'], key=lambda n: n == TilePyramid.META_FILENAME)
+        paths = [
+            Bundle._member_path(tiles, name, Bundle.TILE_NAME)
+            for name in names]
+        if tiles.joinpath(TilePyramid.META_FILENAME).exists():
+            return
+        tiles.mkdir(parents=True, exist_ok=True)
+        for path, name in zip(paths, names):
+            path.write_bytes(bundle.read(f'{Bundle.TILES}/{name}'))
@@ -1,12 +1,13 @@
 
 from pathlib import Path
-from pygame import Surface
 
 from gui.model.base import BaseModel
 from gui.view.base import BaseView
 
 
 class BaseController:
+    __slots__ = ('model', 'view')
+
     view_class = BaseView
     model_class = BaseModel
 
@@ -28,9 +29,6 @@ class BaseController:
         BaseController.__init__(ec, model, view)
         return ec
 
-    def render(self, window: Surface, cell_size: float):
-        raise NotImplementedError()
-
     # Modifications
 
     def change_image(self, new_image: Path):
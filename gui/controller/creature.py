@@ -6,6 +6,8 @@ from gui.view.creature import CreatureView
 
 
 class CreatureController(EntityController):
+    __slots__ = ()
+
     view_class = CreatureView
     model_class = CreatureModel
     model: CreatureModel  # type:ignore
@@ -1,13 +1,18 @@
 
-from pygame import Surface
+from math import ceil
+
+from pygame import Rect, Surface
 
 from gui.controller.base import BaseController
 from gui.model.entity import EntityModel
+from gui.utils.overlay import Overlays
 from gui.values import ImageShape
 from gui.view.entity import EntityView
 
 
 class EntityController(BaseController):
+    __slots__ = ()
+
     view_class = EntityView
     model_class = EntityModel
 
@@ -29,17 +34,43 @@ class EntityController(BaseController):
         EntityController.__init__(ec, model, view)
         return ec
 
-    def render(self, window: Surface, cell_size: float):
-        image = self.view.get_surface()
-
+    def get_blit(
+            self, cell_size: float, origin: tuple[int, int] = (0, 0)
+    ) -> tuple[Surface, tuple[float, float]]:
+        '''Surface and window position, as used by Surface.blits'''
+        x, y = self.get_position(cell_size)
+        return self.view.get_surface(), (x - origin[0], y - origin[1])
+
+    def get_placeholder_blit(
+            self, cell_size: float, origin: tuple[int, int] = (0, 0)
+    ) -> tuple[Surface, tuple[float, float]]:
+        size = int(cell_size * self.model.size)
+        x, y = self.get_position(cell_size)
+        return (
+            Overlays.placeholder(size, size, self.model.shape),
+            (x - origin[0], y - origin[1]))
+
+    def get_position(self, cell_size: float) -> tuple[float, float]:
         # position calculations depending on size_category y cell_size
         x, y = self.model.x * cell_size, self.model.y * cell_size
         if self.model.size < 1:
             prop = cell_size * self.model.size / 2
             x += prop
             y += prop
-
-        window.blit(image, (x, y))
+        return x, y
+
+    def get_rect(self, cell_size: float) -> Rect:
+        x, y = self.get_position(cell_size)
+        size = ceil(cell_size * self.model.size)
+        return Rect(x, y, size, size)
+
+    def get_bounds(self) -> tuple[float, float, float, float]:
+        '''Covered area in cell units as (x0, y0, x1, y1)'''
+        x, y, size = self.model.x, self.model.y, self.model.size
+        if size < 1:
+            x += size / 2
+            y += size / 2
+        return x, y, x + size, y + size
 
     def is_hovering(self, x: int, y: int, cell_size: float) -> bool:
 
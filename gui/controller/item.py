@@ -3,4 +3,4 @@ from gui.controller.entity import EntityController
 
 
 class ItemController(EntityController):
-    ...
+    __slots__ = ()
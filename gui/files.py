@@ -1,34 +1,231 @@
 
+import json
+import os
+from hashlib import sha1
 from pathlib import Path
+from threading import RLock
 from tkinter.messagebox import showerror
 
 ENCOUNTER_FILETYPES = '*.json'
+BUNDLE_FILETYPES = '*.encb'
 IMAGE_FILETYPES = '*.png *.jpg *.jpeg *.gif *.webp *.ico'
+INDEX_FILENAME = '.index.json'
+CACHE_DIRNAME = 'cache'
+AUTOSAVE_DIRNAME = 'autosave'
 
+BASE_DIR_ENV = 'ENCOUNTERMANAGER_HOME'
+DEFAULT_BASE_DIR = '~/.encountermanager'
+
+
+class Directories:
+    '''Application directories, resolved and created only once'''
+
+    def __init__(self, base: Path) -> None:
+        bp = base.expanduser().absolute()
+        if not bp.is_dir():
+            if bp.exists():
+                ttl = 'Invalid base directory'
+                msg = f'"{bp}" exists and is not a directory'
+                showerror(ttl, msg)
+                raise FileExistsError(f'{ttl}: {msg}')
+            bp.mkdir(parents=True)
+
+        ip = bp.joinpath('images')
+        ip.mkdir(parents=True, exist_ok=True)
+        ep = bp.joinpath('encounters')
+        ep.mkdir(parents=True, exist_ok=True)
+        cp = bp.joinpath(CACHE_DIRNAME)
+        cp.mkdir(parents=True, exist_ok=True)
+
+        self.base = bp
+        self.images = ip
+        self.encounters = ep
+        self.cache = cp
 
-def base_dir() -> Path:
-    bp = Path('~/.encountermanager').expanduser()
-    if not bp.is_dir():
-        if bp.exists():
-            ttl = ''
-            msg = ''
-            showerror(ttl, msg)
-            raise FileExistsError(f'{ttl}: {msg}')
-        bp.mkdir()
 
-    return bp
+_directories: Directories | None = None
+
+
+def init_dirs(base: Path | str | None = None) -> Directories:
+    '''Set the base directory, by default taken from the environment'''
+    global _directories, _file_index
+    if base is None:
+        base = os.environ.get(BASE_DIR_ENV) or DEFAULT_BASE_DIR
+    _directories = Directories(Path(base))
+    _file_index = None
+    return _directories
+
+
+def dirs() -> Directories:
+    if _directories is None:
+        return init_dirs()
+    return _directories
+
+
+def base_dir() -> Path:
+    return dirs().base
 
 
 def image_dir() -> Path:
-    ip = base_dir().joinpath('images')
-    ip.mkdir(parents=True, exist_ok=True)
-    return ip
+    return dirs().images
 
 
 def encounter_dir() -> Path:
-    ep = base_dir().joinpath('encounters')
-    ep.mkdir(parents=True, exist_ok=True)
-    return ep
+    return dirs().encounters
+
+
+def cache_dir() -> Path:
+    '''Generated files that can be deleted at any time'''
+    return dirs().cache
+
+
+def autosave_path(file: Path) -> Path:
+    '''Where the encounter opened from file is saved while it is open'''
+    folder = encounter_dir().joinpath(AUTOSAVE_DIRNAME)
+    folder.mkdir(exist_ok=True)
+    # Files with the same name in other folders or of other types
+    key = sha1(str(file.resolve()).encode()).hexdigest()[:16]
+    return folder.joinpath(f'{file.stem}-{key}.json')
+
+
+def journal_path(file: Path) -> Path:
+    '''Changes to the encounter opened from file since its last autosave'''
+    return autosave_path(file).with_suffix('.journal')
+
+
+class FileIndex:
+    '''File names under a directory, stored in disk between sessions
+
+    Directories whose modification time did not change are not listed
+    again when refreshing.
+    '''
+
+    def __init__(
+            self, root: Path, index_file: Path,
+            exclude: tuple[str, ...] = ()) -> None:
+        self.root = root
+        self.index_file = index_file
+        # Directories right under root that are not indexed
+        self.exclude = exclude
+        self._lock = RLock()
+        # Relative directory -> (mtime, subdirectories, entries)
+        self._dirs: dict[str, tuple[int, list[str], list[str]]] = dict()
+        self._names: dict[str, str] = dict()
+        self._fresh = False
+        self._load()
+
+    def _load(self):
+        try:
+            with self.index_file.open('r') as f:
+                data = json.load(f)
+            self._dirs = {
+                d: (mtime, subdirs, entries)
+                for d, (mtime, subdirs, entries) in data['dirs'].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            self._dirs = dict()
+        self._names = self._build_names()
+
+    def _save(self):
+        tmp = self.index_file.with_suffix('.tmp')
+        try:
+            with tmp.open('w') as f:
+                json.dump({'dirs': self._dirs}, f)
+            os.replace(tmp, self.index_file)
+        except OSError:
+            ...
+
+    def _list(self, rel: str) -> tuple[list[str], list[str]]:
+        subdirs: list[str] = []
+        entries: list[str] = []
+        with os.scandir(self.root.joinpath(rel)) as it:
+            for entry in it:
+                if not rel and entry.name in self.exclude:
+                    continue
+                name = entry.name if not rel else f'{rel}/{entry.name}'
+                if entry.is_dir():
+                    subdirs.append(name)
+                    entries.append(name)
+                elif entry.is_file() and entry.name != INDEX_FILENAME:
+                    entries.append(name)
+        return subdirs, entries
+
+    def refresh(self):
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        dirs: dict[str, tuple[int, list[str], list[str]]] = dict()
+        changed = False
+        pending = ['']
+        while pending:
+            rel = pending.pop()
+            try:
+                mtime = self.root.joinpath(rel).stat().st_mtime_ns
+                cached = self._dirs.get(rel)
+                if cached is not None and cached[0] == mtime:
+                    _, subdirs, entries = cached
+                else:
+                    subdirs, entries = self._list(rel)
+                    changed = True
+            except OSError:
+                changed = True
+                continue
+            dirs[rel] = (mtime, subdirs, entries)
+            pending.extend(subdirs)
+
+        changed |= dirs.keys() != self._dirs.keys()
+        self._dirs = dirs
+        self._fresh = True
+        if changed:
+            self._names = self._build_names()
+            self._save()
+
+    def _build_names(self) -> dict[str, str]:
+        '''First path of every file name, in the old depth first order'''
+        names: dict[str, str] = dict()
+        root = self._dirs.get('')
+        if root is None:
+            return names
+
+        path_stack = list(root[2])
+        try:
+            # We look first in the images directory
+            img_idx = path_stack.index(image_dir().name)
+            path_stack.append(path_stack.pop(img_idx))
+        except ValueError:
+            ...
+
+        while len(path_stack):
+            current = path_stack.pop()
+            listing = self._dirs.get(current)
+            if listing is not None:
+                path_stack.extend(listing[2])
+            else:
+                names.setdefault(current.rsplit('/', 1)[-1], current)
+        return names
+
+    def lookup(self, name: str) -> Path | None:
+        with self._lock:
+            if not self._fresh:
+                self._refresh()
+            found = self._names.get(name)
+            if found is None or not self.root.joinpath(found).is_file():
+                # Added or moved since the last refresh
+                self._refresh()
+                found = self._names.get(name)
+        return None if found is None else self.root.joinpath(found)
+
+
+_file_index: FileIndex | None = None
+
+
+def file_index() -> FileIndex:
+    global _file_index
+    if _file_index is None:
+        _file_index = FileIndex(
+            base_dir(), base_dir().joinpath(INDEX_FILENAME),
+            (CACHE_DIRNAME, ))
+    return _file_index
 
 
 def search_image(original_path: Path | str) -> Path | None:
@@ -40,31 +237,13 @@ def search_image(original_path: Path | str) -> Path | None:
         except ValueError:
             return original_path
 
-    # DFS
-    original_name = original_path.name
-
-    path_stack = list(base_dir().iterdir())
+    found = file_index().lookup(original_path.name)
+    if found is None:
+        return None
     try:
-        # We look first in the images directory
-        img_idx = path_stack.index(image_dir())
-        path_stack.append(path_stack.pop(img_idx))
+        return found.relative_to(image_dir())
     except ValueError:
-        ...
-
-    while len(path_stack):
-        current = path_stack.pop()
-
-        if current.is_dir():
-            path_stack.extend(current.iterdir())
-
-        elif current.is_file():
-            if current.name == original_name:
-                try:
-                    return current.relative_to(image_dir())
-                except ValueError:
-                    return current
-
-    return None
+        return found
 
 
 if __name__ == '__main__':
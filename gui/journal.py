@@ -0,0 +1,277 @@
+
+import json
+import logging
+from enum import Enum
+from pathlib import Path
+from typing import Any, Literal
+
+from gui.controller.creature import CreatureController
+from gui.controller.entity import EntityController
+from gui.controller.item import ItemController
+from gui.menu.encounter import Encounter
+from gui.utils.autosave import Autosave, write_atomic
+from gui.utils.history import History, Memento
+from gui.values import CreatureStatus, CreatureTeam, ImageShape
+
+_ENTITIES: dict[str, type[EntityController]] = {
+    c.__name__: c for c in (CreatureController, ItemController)}
+_ENUMS: dict[str, type[Enum]] = {
+    e.__name__: e for e in (CreatureStatus, CreatureTeam, ImageShape)}
+
+
+def _decode(
+        value: Any, encounter: Encounter,
+        refs: dict[int, EntityController]) -> Any:
+    '''Argument of an action, the same entity for the same ref'''
+    if isinstance(value, list):
+        return tuple(_decode(v, encounter, refs) for v in value)
+    if not isinstance(value, dict):
+        return value
+    if 'entity' in value:
+        entity = refs.get(value['ref'])
+        if entity is None:
+            entity = _ENTITIES[value['entity']].from_dict(
+                value['data'], encounter.get_display_cell_size())
+            refs[value['ref']] = entity
+        return entity
+    if 'enum' in value:
+        return _ENUMS[value['enum']](value['value'])
+    return Path(value['path'])
+
+
+def _action_name(action: Any, encounter: Encounter) -> str:
+    if getattr(action, '__self__', None) is not encounter:
+        raise ValueError(f'{action} is not an action of the encounter')
+    return action.__name__
+
+
+class Journal:
+    '''Append-only log of the history of an encounter, for recovery
+
+    Every do, undo and redo is appended as a numbered line, which is
+    much cheaper than a snapshot. The snapshots of the Autosave hold the
+    number of the last line they include: recovering loads the snapshot
+    and replays the lines after it, which are the only ones kept once
+    the snapshot is written.
+
+    An entity can be in several actions, like the one creating it and
+    the one destroying it, and is moved by others in between. It gets a
+    ref number, so the replay builds a single entity for all of them.
+    '''
+    # Lines between snapshots, more make the replay longer
+    COMPACT_RECORDS = 500
+
+    def __init__(
+            self, path: Path, encounter: Encounter,
+            snapshot_path: Path) -> None:
+        self.path = path
+        self.encounter = encounter
+        self.seq = 0  # Number of the last line
+        # Not in a written snapshot, with the refs in them
+        self._lines: list[tuple[int, str, set[int]]] = []
+        self._refs: dict[EntityController, int] = dict()
+        self._next_ref = 0
+        self._requested = 0  # Last line of the last snapshot taken
+        self._compacted = 0  # Last line of the last snapshot written
+        # Set when a write failed, the changes after it are not recorded
+        self.broken = False
+
+        # Every line refers to the ids of this snapshot
+        write_atomic(snapshot_path, json.dumps(self.snapshot()))
+        write_atomic(path, '')
+        self._file = path.open('a')
+        self.autosave = Autosave(snapshot_path, self.snapshot)
+        encounter.history.listeners.append(self.record)
+
+        self.compactions = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        return self.encounter.to_dict() | {
+            'labels': self.encounter.get_labels(),
+            'journal': self.seq,
+        }
+
+    def record(
+            self, kind: Literal['do', 'undo', 'redo'], memento: Memento,
+            merged: bool = False):
+        '''Append a change of the history, a History listener'''
+        self.seq += 1
+        refs: set[int] = set()
+        line = json.dumps(
+            {'seq': self.seq, 'op': kind, 'merged': merged}
+            | self._encode_memento(memento, refs),
+            separators=(',', ':'))
+        try:
+            # Flushed, not synced: it survives the program, not the system
+            self._file.write(line + '\n')
+            self._file.flush()
+        except OSError as e:
+            self._break(e)
+            return
+        self._lines.append((self.seq, line, refs))
+
+        if self.seq - self._requested >= Journal.COMPACT_RECORDS:
+            self._requested = self.seq
+            self.autosave.save()
+
+    def update(self):
+        '''Call every frame, drops the lines of the last written snapshot'''
+        written = self.autosave.written
+        if self.broken or written is None:
+            return
+        if written['journal'] > self._compacted:
+            try:
+                self.compact(written['journal'])
+            except OSError as e:
+                self._break(e)
+
+    def compact(self, seq: int):
+        '''Drop the lines up to seq, included in a written snapshot'''
+        self._lines = [line for line in self._lines if line[0] > seq]
+        self._file.close()
+        write_atomic(
+            self.path, ''.join(f'{line}\n' for _, line, _ in self._lines))
+        self._file = self.path.open('a')
+
+        # The replay starts over for the rest
+        kept = set().union(*(refs for _, _, refs in self._lines))
+        self._refs = {e: r for e, r in self._refs.items() if r in kept}
+        self._compacted = seq
+        self.compactions += 1
+
+    def close(self):
+        '''Stop recording, keeping the files if there were changes'''
+        if self.seq == 0:
+            self.discard()
+            return
+        self._stop()
+        # Once broken, the snapshot is the only record of the last changes
+        if self._requested < self.seq or self.broken:
+            self.autosave.save()
+        self.autosave.close()
+
+    def discard(self):
+        '''Remove the journal and the snapshot, once saved elsewhere'''
+        self._stop()
+        self.autosave.discard()
+        self.path.unlink(missing_ok=True)
+
+    def _stop(self):
+        if self.record in self.encounter.history.listeners:
+            self.encounter.history.listeners.remove(self.record)
+        try:
+            self._file.close()
+        except OSError:
+            ...
+
+    def _break(self, error: OSError):
+        '''Stop recording after a failed write, the session goes on'''
+        # Not report, the dialog would interrupt the action being done
+        logging.warning(f'Journal {self.path} stopped: {error}')
+        self.broken = True
+        self._stop()
+        self._requested = self.seq
+        self.autosave.save()
+
+    # Records
+
+    def _encode(self, value: Any, refs: set[int]) -> Any:
+        '''Argument of an action as JSON, entities as their models'''
+        if isinstance(value, EntityController):
+            ref = self._refs.get(value)
+            if ref is None:
+                self._next_ref += 1
+                ref = self._refs[value] = self._next_ref
+            refs.add(ref)
+            return {
+                'entity': type(value).__name__, 'ref': ref,
+                'data': value.model.to_dict()}
+        if isinstance(value, Enum):
+            return {'enum': type(value).__name__, 'value': value.value}
+        if isinstance(value, Path):
+            return {'path': str(value)}
+        if isinstance(value, (tuple, list)):
+            return [self._encode(v, refs) for v in value]
+        return value
+
+    def _encode_memento(
+            self, memento: Memento, refs: set[int]) -> dict[str, Any]:
+        group = History.group_of(memento)
+        if group is not None:
+            return {'group': [self._encode_memento(m, refs) for m in group]}
+        return {
+            'do': _action_name(memento.action, self.encounter),
+            'args': self._encode(memento.args, refs),
+            'undo': _action_name(memento.reverse_action, self.encounter),
+            'rargs': self._encode(memento.reverse_args, refs),
+            'key': self._encode(memento.merge_key, refs),
+        }
+
+    @staticmethod
+    def _decode_memento(
+            record: dict[str, Any], encounter: Encounter,
+            refs: dict[int, EntityController]) -> Memento:
+        if 'group' in record:
+            return History.grouped([
+                Journal._decode_memento(r, encounter, refs)
+                for r in record['group']])
+        return Memento(
+            getattr(encounter, record['do']),
+            _decode(record['args'], encounter, refs),
+            getattr(encounter, record['undo']),
+            _decode(record['rargs'], encounter, refs),
+            _decode(record['key'], encounter, refs))
+
+    @staticmethod
+    def replay(path: Path, snapshot_path: Path) -> Encounter:
+        '''Encounter of the snapshot with the journal lines after it'''
+        with snapshot_path.open('r') as f:
+            data = json.load(f)
+        encounter = Encounter.from_dict(data)
+        encounter.set_labels(data['labels'])
+        history = encounter.history
+        refs: dict[int, EntityController] = dict()
+
+        # Undone without being in the history, the lines that did them
+        # were dropped. They are on top of the redoable ones, and those
+        # undone before the snapshot are below them.
+        detached = 0
+        with path.open('r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Cut by the crash
+                if record['seq'] <= data['journal']:
+                    continue
+
+                memento = Journal._decode_memento(record, encounter, refs)
+                match record['op']:
+                    case 'do':
+                        detached = 0
+                        group = History.group_of(memento)
+                        if group is None:
+                            history.do(
+                                memento.action, memento.args,
+                                memento.reverse_action, memento.reverse_args,
+                                memento.merge_key, record['merged'])
+                            continue
+                        history.begin()
+                        for m in group:
+                            history.do(
+                                m.action, m.args,
+                                m.reverse_action, m.reverse_args)
+                        history.commit()
+                    case 'undo':
+                        if history.get_n_undoable() > 0:
+                            history.undo()
+                            continue
+                        memento.reverse_action(*memento.reverse_args)
+                        detached += 1
+                    case 'redo':
+                        if detached == 0 and history.get_n_redoable() > 0:
+                            history.redo()
+                            continue
+                        memento.action(*memento.args)
+                        detached = max(0, detached - 1)
+        return encounter
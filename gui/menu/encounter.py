@@ -1,9 +1,10 @@
 
 
 import pygame as pg
-from pygame import Surface
+from pygame import Rect, Surface
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Literal
+from typing import Any, Iterator, Literal
 from math import ceil
 
 from gui.controller.background import BackgroundController
@@ -11,7 +12,15 @@ from gui.controller.creature import CreatureController
 from gui.values import CreatureStatus, CreatureTeam, ImageShape
 from gui.controller.entity import EntityController
 from gui.controller.item import ItemController
+from gui.utils.atlas import SpriteAtlas
+from gui.utils.camera import Camera
+from gui.utils.dirty import DirtyRegions
+from gui.files import search_image
 from gui.utils.history import History
+from gui.utils.loader import SpriteLoader
+from gui.utils.spatial import SpatialHash
+from gui.utils.store import EntityStore
+from gui.utils.table import EntityTable
 from gui.menu.menu import Menu
 from gui.utils import report
 
@@ -19,25 +28,63 @@ from gui.utils import report
 class Encounter(Menu):
 
     HIGHLIGHT_COLOR = (240, 240, 60, 128)
+    HIGHLIGHT_MARGIN = 8
+    OUTSIDE_COLOR = (0, 0, 0)
+    HISTORY_DEPTH = 1000
+    HISTORY_BYTES = 16 * 1024 * 1024
+    # Keep an EntityTable when numpy is available
+    USE_TABLE = True
+    # Draw the sprites from shared atlas pages
+    USE_ATLAS = False
 
     def __init__(
             self, background: BackgroundController,
             entities: list[EntityController],
             min_units: int) -> None:
         self.background = background
-        self.entities = entities
+        # Topmost first in the entities list
+        self.store: EntityStore[EntityController] = EntityStore(entities)
 
         self.min_units = min_units
 
-        self.history = History()
+        self.history = History(
+            Encounter.HISTORY_DEPTH, Encounter.HISTORY_BYTES)
 
         self.grid_visible: bool = False
         self.selected: EntityController | None = None
-        self.updated = True
-
-        cell_size = min(self.get_size()) / self.min_units
+        self.dirty = DirtyRegions()
+        # Areas marked while batching, added at the end
+        self._marks: list[Rect] | None = None
+        # Ids whose table rows are updated at the end of the batch
+        self._stale_rows: set[int] | None = None
+        self.camera = Camera(self.get_size(), self.get_size())
+        # Last visible background and grid, a view each step of panning
+        # would keep many that are not seen again
+        self._static: tuple[tuple, Surface] | None = None
+        self._index: SpatialHash[EntityController] = SpatialHash()
+        self.table = (
+            EntityTable()
+            if Encounter.USE_TABLE and EntityTable.available() else None)
+        self._loading: set[EntityController] = set()
+        self._render_stats: dict[str, int] = dict()
+        self.atlas = SpriteAtlas() if Encounter.USE_ATLAS else None
+        self._cell_size = min(self.get_size()) / self.min_units
+
+        cell_size = self.get_display_cell_size()
         for m in self.entities:
             m.change_cell_size(cell_size)
+            self._track(self.find_entity(m))
+
+    @property
+    def entities(self) -> list[EntityController]:
+        '''Every entity, topmost first. Must not be modified'''
+        return self.store.ordered()
+
+    def saved_order(self) -> list[EntityController]:
+        '''Entities in the order of to_dict, creatures first'''
+        return [
+            e for e in self.entities if isinstance(e, CreatureController)
+        ] + [e for e in self.entities if isinstance(e, ItemController)]
 
     def to_dict(self) -> dict[str, Any]:
         c = [
@@ -68,12 +115,16 @@ class Encounter(Menu):
         cdata = encounter_data.get('creatures', [])
         assert isinstance(cdata, list)
         assert all(isinstance(c, dict) for c in cdata)
-        creatures = [CreatureController.from_dict(c) for c in cdata]
 
         idata = encounter_data.get('items', [])
         assert isinstance(idata, list)
         assert all(isinstance(i, dict) for i in idata)
-        items = [ItemController.from_dict(c) for c in idata]
+
+        resolved = Encounter._resolve_images(cdata + idata)
+        creatures = [
+            CreatureController.from_dict(c) for c in resolved[:len(cdata)]]
+        items = [
+            ItemController.from_dict(c) for c in resolved[len(cdata):]]
 
         entities: list[EntityController] = []
         entities.extend(creatures)
@@ -92,33 +143,136 @@ class Encounter(Menu):
 
         return Encounter(bg, entities, mu)
 
-    # Loopable
-
-    def render(self, window: Surface):
-        # Background
-        self.background.render(window)
+    @staticmethod
+    def _resolve_images(
+            elements: list[dict[str, int | float | str]]
+            ) -> list[dict[str, int | float | str]]:
+        '''Search every distinct image once, in parallel'''
+        names = list({
+            e['img'] for e in elements if isinstance(e.get('img'), str)})
+        found = dict(zip(names, SpriteLoader.map(search_image, names)))
+        return [
+            e | {'img': str(found[e['img']])}  # type:ignore
+            if found.get(e.get('img')) is not None else e  # type:ignore
+            for e in elements]
 
-        cell_size = min(self.get_size()) / self.min_units
+    # Loopable
 
+    def render(self, window: Surface) -> list[Rect]:
+        '''Recomposite the dirty regions of window and return them'''
+        rects = self.dirty.collect(window.get_rect())
+        if not rects:
+            return rects
+
+        cell_size = self.get_display_cell_size()
+        origin = self.camera.origin
+        static = self.get_static_layer()
+        visible = self.get_visible_entities(rects)
+        drawn = placeholders = 0
+        for rect in rects:
+            window.set_clip(rect)
+
+            # Background and grid
+            window.blit(static, rect, rect)
+
+            # TODO: Area effects
+
+            # Highlight selected
+            if self.selected:
+                self.render_highlight(
+                    window, self.selected, cell_size, origin)
+
+            # Entities, in a single call
+            blits = []
+            for e in visible:
+                area = e.get_rect(cell_size).move(-origin[0], -origin[1])
+                if not area.colliderect(rect):
+                    continue
+                drawn += 1
+                if e.view.prepare():
+                    blits.append(e.get_blit(cell_size, origin))
+                else:
+                    blits.append(e.get_placeholder_blit(cell_size, origin))
+                    self._loading.add(e)
+                    placeholders += 1
+            if self.atlas is not None:
+                blits = self.atlas.pack(blits)
+            window.blits(blits, False)
+
+        window.set_clip(None)
+        self._render_stats = {
+            'rects': len(rects),
+            'drawn': drawn,
+            'placeholders': placeholders,
+            'culled': len(self.store) - len(visible),
+        }
+        return rects
+
+    def get_visible_entities(
+            self, rects: list[Rect]) -> list[EntityController]:
+        '''Entities that may overlap the window rects, bottom first
+
+        The rest are skipped without computing their rect or drawing
+        their sprite.
+        '''
+        cell_size = self.get_display_cell_size()
+        ox, oy = self.camera.origin
+        found: set[EntityController] = set()
+        for rect in rects:
+            # One pixel wider, sprite rects are rounded up
+            area = (
+                (rect.left + ox - 1) / cell_size,
+                (rect.top + oy - 1) / cell_size,
+                (rect.right + ox + 1) / cell_size,
+                (rect.bottom + oy + 1) / cell_size)
+            cells = (area[2] - area[0]) * (area[3] - area[1])
+            if self.table is not None and cells > len(self.table):
+                # Large areas, faster to test every entity at once
+                found.update(map(self.store.get, self.table.in_area(*area)))
+            else:
+                found.update(self._index.query_area(*area))
+
+        return self.store.bottom_up(found)
+
+    def render_stats(self) -> dict[str, int]:
+        '''Counters of the last rendered frame'''
+        return dict(self._render_stats)
+
+    def poll_loading(self) -> bool:
+        '''Redraw the entities whose sprites are ready, return if any is left'''
+        ready = [e for e in self._loading if e.view.prepare()]
+        for e in ready:
+            self._loading.discard(e)
+            self.mark_entity(e)
+        return bool(self._loading)
+
+    def get_static_layer(self) -> Surface:
+        '''Visible background and grid, cached until the camera moves'''
+        key = (self.camera.level, self.camera.origin, self.camera.view_size)
+        if self._static is not None and self._static[0] == key:
+            return self._static[1]
+
+        static = Surface(self.camera.view_size)
+        static.fill(Encounter.OUTSIDE_COLOR)
+        self.background.view.render_area(
+            static, self.camera.zoom, self.camera.origin)
         if self.grid_visible:
-            self.render_grid(window, cell_size)
-
-        # TODO: Area effects
-
-        # Highlight selected
-        if self.selected:
-            self.render_highlight(window, self.selected, cell_size)
-
-        # Entities
-        for e in self.entities[::-1]:
-            e.render(window, cell_size)
+            self.render_grid(
+                static, self.get_display_cell_size(), self.camera.origin,
+                self.get_display_size())
+        self._static = key, static
+        return static
 
-        self.updated = False
+    def invalidate_static_layer(self):
+        self._static = None
+        self.dirty.invalidate()
 
     def render_highlight(
-            self, window: Surface, entity: EntityController, cell_size: float):
-        x, y = entity.model.x * cell_size, entity.model.y * cell_size
-        w, h = entity.view.get_surface().get_size()
+            self, window: Surface, entity: EntityController, cell_size: float,
+            origin: tuple[int, int] = (0, 0)):
+        x = entity.model.x * cell_size - origin[0]
+        y = entity.model.y * cell_size - origin[1]
+        w = h = int(cell_size * entity.model.size)
 
         if entity.model.shape is ImageShape.CIRCULAR:
             thick = 4
@@ -131,68 +285,215 @@ class Encounter(Menu):
                 window, Encounter.HIGHLIGHT_COLOR,
                 (x - 3 + offset[0], y - 3 + offset[1], w + 6, h + 6))
 
-    def render_grid(self, window: Surface, cell_size: float):
-
-        w, h = self.get_size()
-        x = y = cell_size
+    def render_grid(
+            self, window: Surface, cell_size: float,
+            origin: tuple[int, int] = (0, 0),
+            size: tuple[int, int] | None = None):
+        '''Draw the lines of a map of size seen from origin'''
+        w, h = size or window.get_size()
+        ox, oy = origin
+        vw, vh = window.get_size()
         white, black = (200, 200, 200), (0, 0, 0)
-        for _ in range(ceil(w / cell_size)):
-            pg.draw.line(window, white, (x, 0), (x, h))
-            pg.draw.line(window, black, (x + 1, 0), (x + 1, h))
-            x += cell_size
-        for _ in range(ceil(h / cell_size)):
-            pg.draw.line(window, white, (0, y), (w, y))
-            pg.draw.line(window, black, (0, y + 1), (w, y + 1))
-            y += cell_size
+
+        window.set_clip(Rect(-ox, -oy, w, h))
+        for i in range(
+                max(1, int(ox / cell_size)),
+                min(ceil(w / cell_size), ceil((ox + vw) / cell_size)) + 1):
+            x = i * cell_size - ox
+            pg.draw.line(window, white, (x, -oy), (x, h - oy))
+            pg.draw.line(window, black, (x + 1, -oy), (x + 1, h - oy))
+        for i in range(
+                max(1, int(oy / cell_size)),
+                min(ceil(h / cell_size), ceil((oy + vh) / cell_size)) + 1):
+            y = i * cell_size - oy
+            pg.draw.line(window, white, (-ox, y), (w - ox, y))
+            pg.draw.line(window, black, (-ox, y + 1), (w - ox, y + 1))
+        window.set_clip(None)
 
     # Getters
 
     def get_entity(self, px_x: int, px_y: int) -> EntityController | None:
-        cell_size = min(self.get_size()) / self.min_units
+        cell_size = self.get_cell_size()
 
-        for entity in self.entities:
-            if entity.is_hovering(px_x, px_y, cell_size):
-                return entity
-        return None
+        # Overlapping entities, the topmost one wins
+        return self.store.topmost(
+            e for e in self._index.query(px_x / cell_size, px_y / cell_size)
+            if e.is_hovering(px_x, px_y, cell_size))
 
     def get_size(self) -> tuple[int, int]:
-        return self.background.view.get_surface().get_size()
+        return self.background.view.get_size()
+
+    def get_display_size(self) -> tuple[int, int]:
+        '''Size with the camera zoom'''
+        return self.background.view.get_pyramid().get_size(
+            self.background.model.scale * self.camera.zoom)
+
+    def get_cell_size(self) -> float:
+        '''Cell size in encounter pixels, without the camera zoom'''
+        return self._cell_size
+
+    def get_display_cell_size(self) -> float:
+        return self._cell_size * self.camera.zoom
+
+    def _update_cell_size(self):
+        self._cell_size = min(self.get_size()) / self.min_units
+        self.camera.resize(self.camera.view_size, self.get_size())
+        cell_size = self.get_display_cell_size()
+        for e in self.entities:
+            e.change_cell_size(cell_size)
+        if self.atlas is not None:
+            self.atlas.clear()
+
+    def get_entity_area(self, entity: EntityController) -> Rect:
+        '''Window area that the entity and its highlight may cover'''
+        cell_size = self.get_display_cell_size()
+        ox, oy = self.camera.origin
+        side = ceil(cell_size * max(entity.model.size, 1))
+        margin = 2 * Encounter.HIGHLIGHT_MARGIN
+        return Rect(
+            entity.model.x * cell_size - ox, entity.model.y * cell_size - oy,
+            side, side).inflate(margin, margin)
+
+    def _selected_id(self) -> int | None:
+        if self.selected is None:
+            return None
+        return self.find_entity(self.selected)
+
+    def mark_entity(self, entity: EntityController | None):
+        # Nothing to add once everything is redrawn
+        if entity is None or self.dirty.full:
+            return
+        if self._marks is not None:
+            self._marks.append(self.get_entity_area(entity))
+            if len(self._marks) > DirtyRegions.MAX_RECTS:
+                # Redrawn whole, the next areas are not computed
+                self.dirty.invalidate()
+        else:
+            self.dirty.add(self.get_entity_area(entity))
+
+    @contextmanager
+    def _batch(self) -> Iterator[None]:
+        '''Add the areas marked inside at once, or redraw everything, and
+        update the table rows of the changed entities at once'''
+        if self._marks is not None:
+            yield
+            return
+
+        self._marks = []
+        if self.table is not None:
+            self._stale_rows = set()
+        try:
+            yield
+        finally:
+            stale, self._stale_rows = self._stale_rows, None
+            if stale and self.table is not None:
+                ids = list(stale)
+                self.table.set_many(
+                    ids, [self.store.get(i).model for i in ids])
+            marks, self._marks = self._marks, None
+            if len(marks) > DirtyRegions.MAX_RECTS:
+                self.dirty.invalidate()
+            else:
+                for area in marks:
+                    self.dirty.add(area)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        '''Record the commands inside as a single undoable action'''
+        with self._batch():
+            self.history.begin()
+            try:
+                yield
+            except BaseException:
+                self.history.rollback()
+                raise
+            self.history.commit()
 
     # Checks & internal
 
     def find_entity(self, entity: EntityController) -> int:
-        try:
-            return self.entities.index(entity)
-        except ValueError:
-            return -1
+        '''Stable id of the entity, -1 if it is not in the encounter'''
+        return self.store.id_of(entity)
+
+    def get_labels(self) -> dict[str, Any]:
+        '''(id, depth) of every entity in the order of to_dict, the last
+        id and depth given, which removed entities may have had, and the
+        id of the selected entity'''
+        ids = [self.find_entity(e) for e in self.saved_order()]
+        return {
+            'entities': [(i, self.store.depth(i)) for i in ids],
+            'counters': self.store.counters(),
+            'selected': self._selected_id(),
+        }
 
-    def _add_entity(self, entity: EntityController):
-        self.entities.insert(0, entity)
+    def set_labels(self, labels: dict[str, Any]):
+        '''Give the entities read by from_dict the labels of get_labels'''
+        entities = self.saved_order()
+        pairs = labels['entities']
+        assert len(entities) == len(pairs)
+        self.store.relabel(
+            {e: (i, depth) for e, (i, depth) in zip(entities, pairs)},
+            tuple(labels['counters']))
+        if self.table is not None:
+            self.table.clear()
+        for i, _ in pairs:
+            self._track(i)
+        selected = labels['selected']
+        self.selected = None if selected is None else self.store.get(selected)
+
+    def _track(self, entity_id: int):
+        '''Update the spatial index and table after a model change'''
+        entity = self.store.get(entity_id)
+        self._index.insert(entity, entity.get_bounds())
+        if self._stale_rows is not None:
+            self._stale_rows.add(entity_id)
+        elif self.table is not None:
+            self.table.set(entity_id, entity.model)
+
+    def _untrack(self, entity_id: int):
+        self._index.remove(self.store.get(entity_id))
+        if self._stale_rows is not None:
+            self._stale_rows.discard(entity_id)
+        if self.table is not None:
+            self.table.remove(entity_id)
+
+    def _add_entity(self, entity_id: int, entity: EntityController):
+        # The zoom may have changed since it was made, it is not undone
+        entity.change_cell_size(self.get_display_cell_size())
+        self.store.add(entity_id, entity)
+        self._track(entity_id)
+        self.mark_entity(self.selected)
         self.selected = entity
-        self.updated = True
-
-    def _rev_add_entity(
-            self, entity: EntityController,
-            prev_selected: EntityController | None):
-        idx = self.find_entity(entity)
-        self.entities.pop(idx)
-        self.selected = prev_selected
-        self.updated = True
-
-    def _remove_entity(self, entity: EntityController):
-        idx = self.find_entity(entity)
-        if idx >= 0:
-            self.entities.pop(idx)
-            if self.selected is entity:
-                self.selected = None
-            self.updated = True
+        self.mark_entity(entity)
+
+    def _rev_add_entity(self, entity_id: int, prev_selected: int | None):
+        entity = self.store.get(entity_id)
+        self._untrack(entity_id)
+        self.store.remove(entity_id)
+        self.mark_entity(entity)
+        self.selected = (
+            None if prev_selected is None else self.store.get(prev_selected))
+        self.mark_entity(self.selected)
+
+    def _remove_entity(self, entity_id: int):
+        entity = self.store.get(entity_id)
+        self._untrack(entity_id)
+        self.store.remove(entity_id)
+        if self.selected is entity:
+            self.selected = None
+        self.mark_entity(entity)
+        # The history keeps the entity, not its sprite
+        entity.view.model_updated()
 
     def _rev_remove_entity(
-            self, entity: EntityController, idx: int, was_selected: bool):
-        self.entities.insert(idx, entity)
+            self, entity_id: int, entity: EntityController, depth: int,
+            was_selected: bool):
+        entity.change_cell_size(self.get_display_cell_size())
+        self.store.add(entity_id, entity, depth)
+        self._track(entity_id)
         if was_selected:
             self.selected = entity
-        self.updated = True
+        self.mark_entity(entity)
 
     def _set_grid(self, min_units: int):
         if min_units < 1:
@@ -200,80 +501,113 @@ class Encounter(Menu):
 
         changed = self.min_units != min_units
         self.min_units = min_units
-        csize = min(self.get_size()) / self.min_units
-        for e in self.entities:
-            e.change_cell_size(csize)
+        self._update_cell_size()
 
-        self.updated |= changed
+        if changed:
+            self.invalidate_static_layer()
 
     def _set_background_image(self, image: Path):
         self.background.change_image(image)
-        self.updated = True
+        self._update_cell_size()
+        self.invalidate_static_layer()
 
-    def _set_selected(self, selected_idx: int | None):
-        if selected_idx is None:
-            self.updated |= self.selected is not None
+    def _set_selected(self, entity_id: int | None):
+        self.mark_entity(self.selected)
+        if entity_id is None:
             self.selected = None
             return
 
-        new = self.entities.pop(selected_idx)
-        self.entities.insert(0, new)
-        self.selected = new
-        self.updated |= new != self.selected
-
-    def _unset_selected(self, prev_selected: bool, old_idx: int | None):
-        if old_idx is not None:
-            self.entities.insert(old_idx, self.entities.pop(0))
-        self.selected = self.entities[0] if prev_selected else None
-        self.updated = True
-
-    def _set_entity_position(self, entity: EntityController, x: int, y: int):
-        self.updated |= (entity.model.x, entity.model.y) != (x, y)
+        self.store.bring_to_front(entity_id)
+        self.selected = self.store.get(entity_id)
+        self.mark_entity(self.selected)
+
+    def _unset_selected(
+            self, entity_id: int | None, depth: int | None,
+            prev_selected: int | None):
+        if entity_id is not None and depth is not None:
+            self.mark_entity(self.store.get(entity_id))
+            self.store.set_depth(entity_id, depth)
+        self.mark_entity(self.selected)
+        self.selected = (
+            None if prev_selected is None else self.store.get(prev_selected))
+        self.mark_entity(self.selected)
+
+    def _set_entity_position(self, entity_id: int, x: int, y: int):
+        entity = self.store.get(entity_id)
+        if (entity.model.x, entity.model.y) == (x, y):
+            return
+        self.mark_entity(entity)
         entity.move(x, y)
-
-    def _set_entity_pos_bulk(
-            self, entities: list[EntityController],
-            new_pos: list[tuple[int, int]]):
-        for e, (x, y) in zip(entities, new_pos):
-            e.move(x, y)
-        self.updated |= any(
-            (e.model.x, e.model.y) != p
-            for e, p in zip(entities, new_pos))
-
-    def _set_creature_team(
-            self, creature: CreatureController, team: CreatureTeam):
-        self.updated |= creature.get_team() != team
+        self._track(entity_id)
+        self.mark_entity(entity)
+
+    def _set_creature_team(self, entity_id: int, team: CreatureTeam):
+        creature = self.store.get(entity_id)
+        assert isinstance(creature, CreatureController)
+        if creature.get_team() != team:
+            self.mark_entity(creature)
         creature.set_team(team)
+        self._track(entity_id)
 
-    def _set_creature_status(
-            self, creature: CreatureController, status: CreatureStatus):
-        self.updated |= creature.get_status() != status
+    def _set_creature_status(self, entity_id: int, status: CreatureStatus):
+        creature = self.store.get(entity_id)
+        assert isinstance(creature, CreatureController)
+        if creature.get_status() != status:
+            self.mark_entity(creature)
         creature.set_status(status)
+        self._track(entity_id)
 
-    def _grow_entity(self, entity: EntityController):
-        self.updated |= True
+    def _grow_entity(self, entity_id: int):
+        entity = self.store.get(entity_id)
         entity.grow()
+        self._track(entity_id)
+        self.mark_entity(entity)
 
-    def _shrink_entity(self, entity: EntityController):
-        self.updated |= True
+    def _shrink_entity(self, entity_id: int):
+        entity = self.store.get(entity_id)
+        self.mark_entity(entity)
         entity.shrink()
-
-    def _replace_entity(self, old: EntityController, new: EntityController):
-        idx = self.find_entity(old)
-        if idx < 0:
-            report.error('_replace_entity not found')
-            return
-        self.entities[idx] = new
+        self._track(entity_id)
+
+    def _replace_entity(self, entity_id: int, new: EntityController):
+        old = self.store.get(entity_id)
+        new.change_cell_size(self.get_display_cell_size())
+        self._index.remove(old)
+        self.store.replace(entity_id, new)
+        self._track(entity_id)
         if self.selected is old:
             self.selected = new
-        self.updated = True
+        self.mark_entity(old)
+        self.mark_entity(new)
 
     def _scale(self, new_scale: float):
         self.background.set_scale(new_scale)
-        csize = min(self.get_size()) / self.min_units
+        self._update_cell_size()
+        self.invalidate_static_layer()
+
+    # View
+
+    def set_view_size(self, view_size: tuple[int, int]):
+        self.camera.resize(view_size)
+        self.dirty.invalidate()
+
+    def zoom(self, steps: int, px_x: float, px_y: float):
+        '''Zoom the camera keeping the window point (px_x, px_y) in place'''
+        if not self.camera.zoom_at(steps, px_x, px_y):
+            return
+        cell_size = self.get_display_cell_size()
         for e in self.entities:
-            e.change_cell_size(csize)
-        self.updated = True
+            e.change_cell_size(cell_size)
+        if self.atlas is not None:
+            self.atlas.clear()
+        self.dirty.invalidate()
+
+    def pan(self, dx: float, dy: float):
+        '''Move the camera by (dx, dy) window pixels'''
+        origin = self.camera.origin
+        self.camera.pan(dx, dy)
+        if self.camera.origin != origin:
+            self.dirty.invalidate()
 
     # Commands
 
@@ -323,22 +657,28 @@ class Encounter(Menu):
             self._scale, (factor * old, ),
             self._scale, (old, ))
 
+    def switch_grid_visibility(self):
+        report.info('switch_grid_visibility')
+        self.grid_visible = not self.grid_visible
+        self.invalidate_static_layer()
+
     # Individual entities
 
     def select_entity(self, entity: EntityController):
-        idx = self.find_entity(entity)
-        if idx < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.warning('select_entity not completed, entity not found')
             return
 
-        if self.entities[idx] is self.selected:
+        if entity is self.selected:
             report.info('select_entity not completed, already selected')
             return
         report.info('select_entity')
 
         self.history.do(
-            self._set_selected, (idx, ),
-            self._unset_selected, (self.selected is not None, idx))
+            self._set_selected, (eid, ),
+            self._unset_selected,
+            (eid, self.store.depth(eid), self._selected_id()))
 
     def deselect_entity(self):
         if self.selected is None:
@@ -347,17 +687,18 @@ class Encounter(Menu):
         report.info('deselect_entity')
         self.history.do(
             self._set_selected, (None, ),
-            self._unset_selected, (True, None))
+            self._unset_selected, (None, None, self._selected_id()))
 
     def move_entity(
             self, entity: EntityController,
             px_x: int | float, px_y: int | float):
-        if self.find_entity(entity) < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('move_entity not completed, entity not found')
             return
         report.info('move_entity')
 
-        cell_size = min(self.get_size()) / self.min_units
+        cell_size = self.get_cell_size()
 
         # Adjustment for different size categories
         v = (entity.model.size - 1) / 2 if entity.model.size > 1 else 0
@@ -370,56 +711,61 @@ class Encounter(Menu):
         x, y = int(px_x / cell_size), int(px_y / cell_size)
 
         self.history.do(
-            self._set_entity_position, (entity, x, y),
+            self._set_entity_position, (eid, x, y),
             self._set_entity_position,
-            (entity, entity.model.x, entity.model.y))
+            (eid, entity.model.x, entity.model.y), ('position', eid))
 
     def move_entity_right(self, entity: EntityController):
-        if self.find_entity(entity) < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('move_entity_right not completed, entity not found')
             return
         report.info('move_entity_right')
         self.history.do(
             self._set_entity_position,
-            (entity, entity.model.x + 1, entity.model.y),
+            (eid, entity.model.x + 1, entity.model.y),
             self._set_entity_position,
-            (entity, entity.model.x, entity.model.y))
+            (eid, entity.model.x, entity.model.y), ('position', eid))
 
     def move_entity_left(self, entity: EntityController):
-        if self.find_entity(entity) < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('move_entity_left not completed, entity not found')
             return
         report.info('move_entity_left')
         self.history.do(
             self._set_entity_position,
-            (entity, entity.model.x - 1, entity.model.y),
+            (eid, entity.model.x - 1, entity.model.y),
             self._set_entity_position,
-            (entity, entity.model.x, entity.model.y))
+            (eid, entity.model.x, entity.model.y), ('position', eid))
 
     def move_entity_up(self, entity: EntityController):
-        if self.find_entity(entity) < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('move_entity_up not completed, entity not found')
             return
         report.info('move_entity_up')
         self.history.do(
             self._set_entity_position,
-            (entity, entity.model.x, entity.model.y - 1),
+            (eid, entity.model.x, entity.model.y - 1),
             self._set_entity_position,
-            (entity, entity.model.x, entity.model.y))
+            (eid, entity.model.x, entity.model.y), ('position', eid))
 
     def move_entity_down(self, entity: EntityController):
-        if self.find_entity(entity) < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('move_entity_down not completed, entity not found')
             return
         report.info('move_entity_down')
         self.history.do(
             self._set_entity_position,
-            (entity, entity.model.x, entity.model.y + 1),
+            (eid, entity.model.x, entity.model.y + 1),
             self._set_entity_position,
-            (entity, entity.model.x, entity.model.y))
+            (eid, entity.model.x, entity.model.y), ('position', eid))
 
     def bring_home(self, entity: EntityController):
-        if self.find_entity(entity) < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('bring_home not completed, entity not found')
             return
         report.info('bring_home')
@@ -432,13 +778,13 @@ class Encounter(Menu):
         report.info(f'{entity.model.x, entity.model.y} -> {x, y}')
         self.history.do(
             self._set_entity_position,
-            (entity, x, y),
+            (eid, x, y),
             self._set_entity_position,
-            (entity, entity.model.x, entity.model.y))
+            (eid, entity.model.x, entity.model.y), ('position', eid))
 
     def change_entity_type(self, entity: EntityController):
-        idx = self.find_entity(entity)
-        if idx < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('change_creature_type not completed, not found')
             return
         report.info('change_entity_type')
@@ -456,14 +802,15 @@ class Encounter(Menu):
                 return
 
         newe = new.from_dict(
-            entity.model.to_dict(), min(self.get_size()) / self.min_units)
+            entity.model.to_dict(), self.get_display_cell_size())
 
         self.history.do(
-            self._replace_entity, (entity, newe),
-            self._replace_entity, (newe, entity))
+            self._replace_entity, (eid, newe),
+            self._replace_entity, (eid, entity))
 
     def change_creature_team(self, entity: EntityController):
-        if self.find_entity(entity) < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('change_creature_team not completed, not found')
             return
         if not isinstance(entity, CreatureController):
@@ -473,11 +820,12 @@ class Encounter(Menu):
         old = entity.get_team()
         new_team = old.next()
         self.history.do(
-            self._set_creature_team, (entity, new_team),
-            self._set_creature_team, (entity, old))
+            self._set_creature_team, (eid, new_team),
+            self._set_creature_team, (eid, old))
 
     def change_creature_status(self, entity: EntityController):
-        if self.find_entity(entity) < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('change_creature_status not completed, not found')
             return
         if not isinstance(entity, CreatureController):
@@ -487,26 +835,28 @@ class Encounter(Menu):
         old = entity.get_status()
         new_status = old.next()
         self.history.do(
-            self._set_creature_status, (entity, new_status),
-            self._set_creature_status, (entity, old))
+            self._set_creature_status, (eid, new_status),
+            self._set_creature_status, (eid, old))
 
     def grow_entity(self, entity: EntityController):
-        if self.find_entity(entity) < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('grow_entity not completed, not found')
             return
         report.info('grow_entity')
         self.history.do(
-            self._grow_entity, (entity, ),
-            self._shrink_entity, (entity, ))
+            self._grow_entity, (eid, ),
+            self._shrink_entity, (eid, ))
 
     def shrink_entity(self, entity: EntityController):
-        if self.find_entity(entity) < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('shrink_entity not completed, not found')
             return
         report.info('shrink_entity')
         self.history.do(
-            self._shrink_entity, (entity, ),
-            self._grow_entity, (entity, ))
+            self._shrink_entity, (eid, ),
+            self._grow_entity, (eid, ))
 
     # Globals
 
@@ -516,42 +866,53 @@ class Encounter(Menu):
         csize = min(w, h) / self.min_units
         maxx, maxy = int(w / csize), int(h / csize)
 
-        new_pos = [
-            (
-                max(0, min(maxx - ceil(e.model.size), e.model.x)),
-                max(0, min(e.model.y, maxy - ceil(e.model.size))))
-            for e in self.entities]
-        old_pos = [(e.model.x, e.model.y) for e in self.entities]
-        self.history.do(
-            self._set_entity_pos_bulk, (self.entities, new_pos),
-            self._set_entity_pos_bulk, (self.entities, old_pos))
+        if self.table is not None:
+            ids, old_pos, new_pos = self.table.outside(maxx, maxy)
+        else:
+            ids, old_pos, new_pos = [], [], []
+            for e in self.entities:
+                x = max(0, min(maxx - ceil(e.model.size), e.model.x))
+                y = max(0, min(e.model.y, maxy - ceil(e.model.size)))
+                if (x, y) != (e.model.x, e.model.y):
+                    ids.append(self.find_entity(e))
+                    old_pos.append((e.model.x, e.model.y))
+                    new_pos.append((x, y))
+
+        # Only the entities that move
+        with self.transaction():
+            for eid, new, old in zip(ids, new_pos, old_pos):
+                self.history.do(
+                    self._set_entity_position, (eid, *new),
+                    self._set_entity_position, (eid, *old))
 
     def create_creature(self, image: Path):
         report.info('create_creature')
         c = CreatureController.from_dict(
-            {'img': str(image)}, min(self.get_size()) / self.min_units)
+            {'img': str(image)}, self.get_display_cell_size())
+        eid = self.store.new_id()
         self.history.do(
-            self._add_entity, (c, ),
-            self._rev_add_entity, (c, self.selected))
+            self._add_entity, (eid, c),
+            self._rev_add_entity, (eid, self._selected_id()))
 
     def create_item(self, image: Path):
         report.info('create_item')
         i = ItemController.from_dict(
-            {'img': str(image)}, min(self.get_size()) / self.min_units)
+            {'img': str(image)}, self.get_display_cell_size())
+        eid = self.store.new_id()
         self.history.do(
-            self._add_entity, (i, ),
-            self._rev_add_entity, (i, self.selected))
+            self._add_entity, (eid, i),
+            self._rev_add_entity, (eid, self._selected_id()))
 
     def destroy_entity(self, entity: EntityController):
         report.info('destroy_entity')
-        idx = self.find_entity(entity)
-        if idx < 0:
+        eid = self.find_entity(entity)
+        if eid < 0:
             report.info('destroy_entity not completed, not found')
             return
         self.history.do(
-            self._remove_entity, (entity,),
+            self._remove_entity, (eid, ),
             self._rev_remove_entity,
-            (entity, idx, entity is self.selected))
+            (eid, entity, self.store.depth(eid), entity is self.selected))
 
     # History
 
@@ -560,11 +921,13 @@ class Encounter(Menu):
             report.info('undo not completed, no actions left')
             return
         report.info('undo')
-        self.history.undo()
+        with self._batch():
+            self.history.undo()
 
     def redo(self):
         if self.history.get_n_redoable() < 1:
             report.info('redo not completed, no actions left')
             return
         report.info('redo')
-        self.history.redo()
+        with self._batch():
+            self.history.redo()
@@ -4,7 +4,9 @@ from gui.model.base import BaseModel
 
 
 class BackgroundModel(BaseModel):
-    scale = 1.0
+    __slots__ = ('scale', )
+
+    DEFAULT_SCALE = 1.0
 
     def __init__(self, scale: float) -> None:
         self.scale = scale
@@ -12,11 +14,11 @@ class BackgroundModel(BaseModel):
     def to_dict(self) -> dict[str, Any]:
         return super().to_dict() | ({
             'scale': self.scale
-        } if self.scale != BackgroundModel.scale else {})
+        } if self.scale != BackgroundModel.DEFAULT_SCALE else {})
 
     @classmethod
     def from_dict(cls, element_data: dict[str, str | int | float]):
-        scale = element_data.get('scale', cls.scale)
+        scale = element_data.get('scale', cls.DEFAULT_SCALE)
         assert isinstance(scale, (float, int)), (
             'The background "scale" must be a number')
         assert scale > 0, 'The background scale must be bigger than 0'
@@ -7,6 +7,7 @@ from gui.files import IMAGE_FILETYPES, image_dir, search_image
 
 
 class BaseModel:
+    __slots__ = ('image_path', )
 
     def __init__(self, image_path: Path | str) -> None:
         # Doesn't change if it's absolute
@@ -4,9 +4,11 @@ from gui.values import CreatureStatus, CreatureTeam, ImageShape
 
 
 class CreatureModel(EntityModel):
-    status = CreatureStatus.ALIVE
-    team = CreatureTeam.NONE
-    shape = ImageShape.CIRCULAR
+    __slots__ = ('status', 'team')
+
+    DEFAULT_STATUS = CreatureStatus.ALIVE
+    DEFAULT_TEAM = CreatureTeam.NONE
+    DEFAULT_SHAPE = ImageShape.CIRCULAR
 
     def __init__(self, status: CreatureStatus, team: CreatureTeam) -> None:
         self.status = status
@@ -15,23 +17,23 @@ class CreatureModel(EntityModel):
     def to_dict(self) -> dict[str, int | float | str]:
         return super().to_dict() | ({
             'status': self.status.value
-        } if self.status != type(self).status else {}) | ({
+        } if self.status != self.DEFAULT_STATUS else {}) | ({
             'team': self.team.value
-        } if self.team != type(self).team else {})
+        } if self.team != self.DEFAULT_TEAM else {})
 
     @classmethod
     def from_dict(
             cls, element_data: dict[str, str | int | float]
             ):
 
-        status = element_data.get('status', cls.status.value)
+        status = element_data.get('status', cls.DEFAULT_STATUS.value)
         assert CreatureStatus.has_value(status), (
             'The creature status must be one of the supported '
             f'options {tuple(s.value for s in CreatureStatus)},'
             f' not {repr(status)}')
         status = CreatureStatus(status)
 
-        team = element_data.get('team', cls.team.value)
+        team = element_data.get('team', cls.DEFAULT_TEAM.value)
         assert CreatureTeam.has_value(team), (
             'The creature team must be one of the supported '
             f'options {tuple(s.value for s in CreatureTeam)},'
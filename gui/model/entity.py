@@ -5,10 +5,12 @@ from gui.values import ImageShape
 
 
 class EntityModel(BaseModel):
-    x = 0
-    y = 0
-    size = 1
-    shape = ImageShape.ORIGINAL
+    __slots__ = ('x', 'y', 'size', 'shape')
+
+    DEFAULT_X = 0
+    DEFAULT_Y = 0
+    DEFAULT_SIZE = 1
+    DEFAULT_SHAPE = ImageShape.ORIGINAL
 
     def __init__(
             self, x: int, y: int, size: int | float, shape: ImageShape
@@ -19,31 +21,31 @@ class EntityModel(BaseModel):
         self.shape = shape
 
     def to_dict(self) -> dict[str, Any]:
-        default_pos = (self.__class__.x, self.__class__.y)
+        default_pos = (self.DEFAULT_X, self.DEFAULT_Y)
         return super().to_dict() | ({
             'x': self.x,
             'y': self.y,
         } if (self.x, self.y) != default_pos else {}) | ({
             'size': self.size
-        } if self.size != self.__class__.size else {}) | ({
+        } if self.size != self.DEFAULT_SIZE else {}) | ({
             'shape': self.shape.value,
-        } if self.shape != self.__class__.shape else {})
+        } if self.shape != self.DEFAULT_SHAPE else {})
 
     @classmethod
     def from_dict(
             cls, element_data: dict[str, str | int | float]
             ):
 
-        posx = element_data.get('x', cls.x)
-        posy = element_data.get('y', cls.y)
+        posx = element_data.get('x', cls.DEFAULT_X)
+        posy = element_data.get('y', cls.DEFAULT_Y)
         assert isinstance(posx, int) and isinstance(posy, int), (
             'Positions "x" and "y" must be integers')
 
-        size = element_data.get('size', cls.size)
+        size = element_data.get('size', cls.DEFAULT_SIZE)
         assert isinstance(size, (int, float)), (
             'The size category "size" must be a number')
 
-        shape = element_data.get('shape', cls.shape.value)
+        shape = element_data.get('shape', cls.DEFAULT_SHAPE.value)
         assert ImageShape.has_value(shape), (
             'The image shape must be one of the supported '
             f'options {tuple(s.value for s in ImageShape)}, not {repr(shape)}')
@@ -4,4 +4,6 @@ from gui.model.entity import EntityModel
 
 
 class ItemModel(EntityModel):
-    shape = ImageShape.ORIGINAL
+    __slots__ = ()
+
+    DEFAULT_SHAPE = ImageShape.ORIGINAL
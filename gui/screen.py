@@ -2,31 +2,43 @@
 from pathlib import Path
 from tkinter.filedialog import askopenfilename
 
-from pygame import Surface
+from pygame import Rect, Surface
 import pygame as pg
 
 from gui.controller.entity import EntityController
 from gui.menu.encounter import Encounter
 from gui.user_input import UserInput
 from gui.files import IMAGE_FILETYPES, image_dir
+from gui.journal import Journal
+from gui.utils.loader import SpriteLoader
+from gui.utils.scheduler import FrameScheduler
 
 
 class Screen:
     GHOST_TRANSPARENCY = (255, 255, 255, 128)
     WINDOW_ENLARGE_FACTOR = 1.15
     WINDOW_SHRINK_FACTOR = 0.85
+    BUSY_FPS = 60
+    # Bigger maps are seen through the camera, updated from the desktop
+    MAX_WINDOW_SIZE = (1600, 900)
+    MAX_WINDOW_FRACTION = 0.9
 
     def __init__(self, encounter: Encounter) -> None:
+        self.input = UserInput()
+        self.encounter = encounter
+
         self._precalc: Surface = Surface(
-            encounter.get_size(), pg.BLEND_RGBA_MULT)
+            self.get_window_size(), pg.BLEND_RGBA_MULT)
         self._last_ghost: tuple[EntityController, Surface] | None = None
+        self._ghost_rect: Rect | None = None
 
-        self.input = UserInput()
-        self.encounter = encounter
         self.window = pg.display.set_mode(self._precalc.get_size())
+        self.encounter.set_view_size(self.window.get_size())
         pg.display.set_caption('EncounterManager')
         self.ghost_active: bool = False
-        self.updated = True
+        self.loading = False
+        self.scheduler = FrameScheduler(Screen.BUSY_FPS)
+        self.journal: Journal | None = None
 
     @staticmethod
     def from_image(image: Path):
@@ -42,38 +54,59 @@ class Screen:
             return self.encounter.selected
         return None
 
+    @property
+    def busy(self) -> bool:
+        '''Whether the next frame has to be drawn without waiting'''
+        return (
+            self.moving_entity is not None or self.input.rightclicking
+            or bool(self.encounter.dirty))
+
+    def get_window_size(self) -> tuple[int, int]:
+        w, h = self.encounter.get_size()
+        maxw, maxh = Screen.MAX_WINDOW_SIZE
+        return min(w, maxw), min(h, maxh)
+
     def loop(self):
 
-        clock = pg.time.Clock()
         while not self.input.quit:
 
             # Show
             self.show()
-            clock.tick(20)
 
             # Input
-            self.input.fromEvents(pg.event.get())
+            self.input.fromEvents(
+                self.scheduler.wait(self.busy, self.loading))
 
             # Update
             self.update()
+            if self.journal is not None:
+                self.journal.update()
 
     def show(self):
         # TODO: Menus
 
         # Encounter
-        if self.updated:
-            self.encounter.render(self._precalc)
+        self.loading = self.encounter.poll_loading()
+        rects = self.encounter.render(self._precalc)
 
-            # Selected entity ghost
-            self.render_selected_ghost()
+        # The ghost is drawn over the window only, _precalc stays clean
+        if self._ghost_rect is not None:
+            rects.append(self._ghost_rect)
+        for rect in rects:
+            self.window.blit(self._precalc, rect, rect)
 
-        self.window.blit(self._precalc, (0, 0))
-        pg.display.update()
+        # Selected entity ghost
+        self._ghost_rect = self.render_selected_ghost()
+        if self._ghost_rect is not None:
+            rects.append(self._ghost_rect)
 
-    def render_selected_ghost(self):
+        if rects:
+            pg.display.update(rects)
+
+    def render_selected_ghost(self) -> Rect | None:
         entity = self.moving_entity
         if entity is None:
-            return
+            return None
 
         if self._last_ghost is None or self._last_ghost[0] is not entity:
 
@@ -82,30 +115,36 @@ class Screen:
             self._last_ghost = (entity, surf)
 
         g = self._last_ghost[1]
-        self._precalc.blit(g, (
+        return self.window.blit(g, (
             self.input.mousex - g.get_width() // 2,
             self.input.mousey - g.get_height() // 2))
 
     def update(self):
-        self.updated = False
 
-        if self.input.leftclick:
-            e = self.encounter.get_entity(*self.input.mousepos)
-            if e is not None:
-                self.encounter.select_entity(e)
-                self.ghost_active = True
-                self._last_ghost = None
-            self.updated = True
-
-        if self.input.leftunclick:
-            if self.encounter.selected:
-                self.encounter.move_entity(
-                    self.encounter.selected, *self.input.mousepos)
-                self.updated = True
-            self.ghost_active = False
-
-        if self.input.leftclicking:
-            self.updated = True
+        # Every event of the frame, in order
+        for evento in self.input.events:
+            match evento.type:
+                case pg.MOUSEBUTTONDOWN if evento.button == pg.BUTTON_LEFT:
+                    self.update_leftclick(evento.pos)
+                case pg.MOUSEBUTTONUP if evento.button == pg.BUTTON_LEFT:
+                    self.update_leftunclick(evento.pos)
+                case pg.MOUSEWHEEL:
+                    self.encounter.zoom(evento.y, *self.input.mousepos)
+                case pg.KEYDOWN:
+                    self.update_key(*UserInput.key_of(evento))
+
+        # Right button drag pans the camera
+        if self.input.rightclicking and self.input.mousemoved:
+            self.encounter.pan(
+                self.input.old_mousepos[0] - self.input.mousex,
+                self.input.old_mousepos[1] - self.input.mousey)
+
+        # The commands of the frame share a single resize and redraw
+        if self.window.get_size() != self.get_window_size():
+            self.window = pg.display.set_mode(self.get_window_size())
+            pg.display.set_caption('EncounterManager')
+            self._precalc = self.window.copy()
+            self.encounter.set_view_size(self.window.get_size())
 
         # TESTING
 
@@ -128,11 +167,25 @@ class Screen:
 
         elif not self.input.leftclicking:
             self.ghost_active = False'''
-        if not any(self.input.keypressed):
-            return
+
+    def update_leftclick(self, pos: tuple[int, int]):
+        e = self.encounter.get_entity(*self.encounter.camera.to_world(*pos))
+        if e is not None:
+            self.encounter.select_entity(e)
+            self.ghost_active = True
+            self._last_ghost = None
+
+    def update_leftunclick(self, pos: tuple[int, int]):
+        if self.encounter.selected:
+            self.encounter.move_entity(
+                self.encounter.selected,
+                *self.encounter.camera.to_world(*pos))
+        self.ghost_active = False
+
+    def update_key(self, keyname: str, keyunicode: str, keycode: int | None):
 
         key_reg = True
-        match self.input.keyunicode.upper():
+        match keyunicode.upper():
             case 'B':
                 image_path = askopenfilename(
                     initialdir=image_dir(),
@@ -143,8 +196,7 @@ class Screen:
                     self.encounter.change_background(Path(image_path))
 
             case 'D':  # D
-                self.encounter.grid_visible = not self.encounter.grid_visible
-                self.encounter.updated = True
+                self.encounter.switch_grid_visibility()
 
             case 'G':  # G
                 self.encounter.reduce_grid()
@@ -216,19 +268,10 @@ class Screen:
             case _:
                 key_reg = False
 
-        if self.window.get_size() != self.encounter.get_size():
-            self.window = pg.display.set_mode(
-                self.encounter.get_size())
-            pg.display.set_caption('EncounterManager')
-            self._precalc = self.window.copy()
-            self.updated = True
-
         if key_reg:
-            self.updated = True
             return
 
-        key_reg = True
-        match self.input.keyname:
+        match keyname:
             case 'escape':  # Esc
                 self.encounter.deselect_entity()
 
@@ -249,9 +292,7 @@ class Screen:
                 if self.encounter.selected is not None:
                     self.encounter.destroy_entity(self.encounter.selected)
             case _:
-                key_reg = False
-
-        self.updated |= key_reg
+                ...
 
     @staticmethod
     def init():
@@ -261,8 +302,15 @@ class Screen:
         pg.display.set_mode()
         pg.display.set_caption('EncounterManager')
 
+        desktop = pg.display.get_desktop_sizes()
+        if desktop:
+            Screen.MAX_WINDOW_SIZE = (
+                int(desktop[0][0] * Screen.MAX_WINDOW_FRACTION),
+                int(desktop[0][1] * Screen.MAX_WINDOW_FRACTION))
+
     @staticmethod
     def close():
+        SpriteLoader.shutdown()
         pg.display.quit()
         pg.font.quit()
         pg.init()
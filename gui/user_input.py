@@ -31,6 +31,9 @@ class UserInput:
         self.drop_file: str | None = None
         self.old_drop_file: str | None = None
 
+        # Every relevant event of the frame, in order
+        self.events: list[event.Event] = []
+
         self.quit: bool = False
 
     def update(
@@ -42,7 +45,8 @@ class UserInput:
             wheel: tuple[int, int],
             keyPressed: tuple[str, str, str],
             drop_file: str | None,
-            quit: bool):
+            quit: bool,
+            events: list[event.Event] | None = None):
 
         self.old_clicking = self.clicking
         self.old_click = self.click
@@ -59,9 +63,18 @@ class UserInput:
         self.mousepos = mousePos
         self.wheel = wheel
         self.drop_file = drop_file
+        self.events = [] if events is None else events
 
         self.quit = quit
 
+    @staticmethod
+    def key_of(evento: event.Event) -> tuple[str, str, int | None]:
+        name = key.name(evento.key)
+        try:
+            return name, evento.unicode, key.key_code(name)
+        except ValueError:
+            return name, evento.unicode, None
+
     def fromEvents(self, events: list[event.Event]):
 
         key_pressed = ('', '', '')
@@ -72,20 +85,16 @@ class UserInput:
         clicking = mouse.get_pressed()
         clicking = (clicking[0], clicking[2])
         drop_file: str | None = None
+        queue: list[event.Event] = []
 
         for evento in events:
 
             if evento.type == QUIT:
                 quit = True
+                continue
 
             elif evento.type == KEYDOWN:
-                key_pressed = key.name(evento.key)
-                try:
-                    key_pressed = (
-                        key_pressed, evento.unicode,
-                        key.key_code(key_pressed))
-                except ValueError:
-                    key_pressed = key_pressed, evento.unicode, None
+                key_pressed = UserInput.key_of(evento)  # type:ignore
 
             elif evento.type == MOUSEWHEEL:
                 wheel = (evento.x, evento.y)
@@ -101,11 +110,16 @@ class UserInput:
             elif evento.type == DROPFILE:
                 drop_file = evento.file
 
+            else:
+                continue
+
+            queue.append(evento)
+
         pos = mouse.get_pos()
 
         self.update(
             tuple(click), tuple(unclick), clicking,  # type:ignore
-            pos, wheel, key_pressed, drop_file, quit)  # type:ignore
+            pos, wheel, key_pressed, drop_file, quit, queue)  # type:ignore
 
     @property
     def wheelx(self):
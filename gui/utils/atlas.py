@@ -0,0 +1,73 @@
+
+import pygame as pg
+from pygame import Rect, Surface
+
+
+class SpriteAtlas:
+    '''Sprites copied into a few big pages, drawn as areas of them
+
+    Pages are filled in shelves, rows as tall as their tallest sprite.
+    When every page is full the atlas starts over.
+    '''
+    PAGE_SIZE = 2048
+    MAX_PAGES = 4
+
+    def __init__(self) -> None:
+        self._pages: list[Surface] = []
+        # Sprite -> (page, area), the sprite is kept alive by the key
+        self._areas: dict[Surface, tuple[Surface, Rect]] = dict()
+        self._x = self._y = self._shelf = 0
+
+    def __len__(self) -> int:
+        return len(self._areas)
+
+    def clear(self):
+        self._pages.clear()
+        self._areas.clear()
+        self._x = self._y = self._shelf = 0
+
+    def lookup(self, sprite: Surface) -> tuple[Surface, Rect] | None:
+        '''Page and area holding sprite, added if missing
+
+        None if the sprite does not fit in a page.
+        '''
+        found = self._areas.get(sprite)
+        if found is not None:
+            return found
+
+        w, h = sprite.get_size()
+        size = SpriteAtlas.PAGE_SIZE
+        if w > size or h > size:
+            return None
+
+        if self._x + w > size:
+            # Next shelf
+            self._x = 0
+            self._y += self._shelf
+            self._shelf = 0
+        if not self._pages or self._y + h > size:
+            if len(self._pages) == SpriteAtlas.MAX_PAGES:
+                self.clear()
+            self._pages.append(Surface((size, size), pg.SRCALPHA))
+            self._x = self._y = self._shelf = 0
+
+        page = self._pages[-1]
+        area = Rect(self._x, self._y, w, h)
+        # Max over the transparent page copies the pixels unblended
+        page.blit(sprite, area, special_flags=pg.BLEND_RGBA_MAX)
+        self._x += w
+        self._shelf = max(self._shelf, h)
+
+        self._areas[sprite] = (page, area)
+        return page, area
+
+    def pack(self, blits: list[tuple]) -> list[tuple]:
+        '''Replace the sprites of (surface, position) pairs by atlas areas'''
+        packed = []
+        for surface, position in blits:
+            found = self.lookup(surface)
+            if found is None:
+                packed.append((surface, position))
+            else:
+                packed.append((found[0], position, found[1]))
+        return packed
@@ -0,0 +1,79 @@
+
+import json
+import logging
+import os
+from pathlib import Path
+from threading import Condition, Thread
+from typing import Any, Callable
+
+
+def write_atomic(path: Path, text: str):
+    '''Replace path with text, a crash leaves the old or the new file'''
+    tmp = path.with_name(f'.{path.name}.tmp')
+    with tmp.open('w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Autosave:
+    '''Writes snapshots of a state in a background thread
+
+    The state is copied with snapshot on the caller thread when save
+    is called. Serializing and writing never block it.
+    '''
+
+    def __init__(
+            self, path: Path, snapshot: Callable[[], dict[str, Any]]) -> None:
+        self.path = path
+        self.snapshot = snapshot
+
+        # Latest snapshot waiting to be written, older ones are skipped
+        self._pending: dict[str, Any] | None = None
+        self._stopping = False
+        self._condition = Condition()
+        self._writer = Thread(target=self._run, name='autosave', daemon=True)
+        self._writer.start()
+
+        self.writes = 0
+        # Last snapshot written, set by the writer thread
+        self.written: dict[str, Any] | None = None
+
+    def save(self):
+        '''Take a snapshot now and queue it for writing'''
+        data = self.snapshot()
+        with self._condition:
+            self._pending = data
+            self._condition.notify()
+
+    def close(self):
+        '''Stop the writer, after writing the queued snapshot'''
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._writer.join()
+
+    def discard(self):
+        '''Remove the autosave, once the state is saved elsewhere'''
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopping:
+                    self._condition.wait()
+                data, self._pending = self._pending, None
+                stopping = self._stopping
+
+            if data is not None:
+                try:
+                    write_atomic(self.path, json.dumps(data))
+                    self.writes += 1
+                    self.written = data
+                except OSError as e:
+                    # Not report, dialogs can't be shown from this thread
+                    logging.warning(f'Autosave to {self.path} failed: {e}')
+            if stopping:
+                return
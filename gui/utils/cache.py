@@ -0,0 +1,82 @@
+
+from collections import OrderedDict
+from threading import RLock
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class LRUCache(Generic[K, V]):
+    '''Least recently used cache bounded by an estimated size in bytes
+
+    Safe to share with the loader threads.
+    '''
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[V], int]) -> None:
+        self._items: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._lock = RLock()
+        self._sizeof = sizeof
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._items
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: K, value: V):
+        size = self._sizeof(value)
+        with self._lock:
+            self.discard(key)
+            self._items[key] = (value, size)
+            self.nbytes += size
+            self._evict()
+
+    def discard(self, key: K):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self.nbytes -= item[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def set_max_bytes(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        # The most recent item is kept even if it is over the budget alone
+        while self.nbytes > self.max_bytes and len(self._items) > 1:
+            _, (_, size) = self._items.popitem(last=False)
+            self.nbytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'items': len(self._items),
+            'bytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
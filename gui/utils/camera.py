@@ -0,0 +1,88 @@
+
+from pygame import Rect
+
+
+class Camera:
+    '''Visible part of the encounter and its zoom
+
+    Zoom goes in discrete levels so every level can keep its own cached
+    layers. The position is the world pixel at the top left corner.
+    '''
+    ZOOM_STEP = 2 ** 0.25
+    MIN_LEVEL = -12
+    MAX_LEVEL = 8
+
+    def __init__(
+            self, view_size: tuple[int, int],
+            world_size: tuple[int, int]) -> None:
+        self.view_size = view_size
+        self.world_size = world_size
+        self.level = 0
+        self.x = 0.0
+        self.y = 0.0
+
+    @property
+    def zoom(self) -> float:
+        return Camera.ZOOM_STEP ** self.level
+
+    @property
+    def origin(self) -> tuple[int, int]:
+        '''Top left corner in zoomed pixels'''
+        return round(self.x * self.zoom), round(self.y * self.zoom)
+
+    def get_rect(self) -> Rect:
+        '''Visible area in zoomed pixels'''
+        return Rect(self.origin, self.view_size)
+
+    def to_world(self, sx: float, sy: float) -> tuple[float, float]:
+        zoom = self.zoom
+        return sx / zoom + self.x, sy / zoom + self.y
+
+    def to_screen(self, wx: float, wy: float) -> tuple[float, float]:
+        zoom = self.zoom
+        return (wx - self.x) * zoom, (wy - self.y) * zoom
+
+    def resize(
+            self, view_size: tuple[int, int],
+            world_size: tuple[int, int] | None = None):
+        self.view_size = view_size
+        if world_size is not None:
+            self.world_size = world_size
+        self._clamp()
+
+    def pan(self, dx: float, dy: float):
+        '''Move the view by (dx, dy) screen pixels'''
+        zoom = self.zoom
+        self.x += dx / zoom
+        self.y += dy / zoom
+        self._clamp()
+
+    def zoom_at(self, steps: int, sx: float, sy: float) -> bool:
+        '''Zoom keeping the point under (sx, sy) fixed, return if changed'''
+        level = max(
+            Camera.MIN_LEVEL, min(Camera.MAX_LEVEL, self.level + steps))
+        if level == self.level:
+            return False
+
+        wx, wy = self.to_world(sx, sy)
+        self.level = level
+        zoom = self.zoom
+        self.x = wx - sx / zoom
+        self.y = wy - sy / zoom
+        self._clamp()
+        return True
+
+    def _clamp(self):
+        zoom = self.zoom
+        self.x = Camera._clamp_axis(
+            self.x, self.view_size[0] / zoom, self.world_size[0])
+        self.y = Camera._clamp_axis(
+            self.y, self.view_size[1] / zoom, self.world_size[1])
+
+    @staticmethod
+    def _clamp_axis(position: float, view: float, world: float) -> float:
+        free = world - view
+        if free < 0:
+            # Smaller than the view, centered
+            return free / 2
+        return max(0, min(free, position))
@@ -0,0 +1,50 @@
+
+from pygame import Rect
+
+
+class DirtyRegions:
+    '''Window areas that have to be recomposited on the next render'''
+    MAX_RECTS = 24
+
+    def __init__(self) -> None:
+        self._rects: list[Rect] = []
+        self._full = True
+
+    def __bool__(self) -> bool:
+        return self._full or bool(self._rects)
+
+    @property
+    def full(self) -> bool:
+        return self._full
+
+    def invalidate(self):
+        self._full = True
+        self._rects.clear()
+
+    def add(self, rect: Rect | tuple[float, float, float, float]):
+        if self._full:
+            return
+        rect = Rect(rect)
+        if rect.w <= 0 or rect.h <= 0:
+            return
+
+        # Merge with every overlapping region so rects never overlap
+        idx = rect.collidelist(self._rects)
+        while idx >= 0:
+            rect.union_ip(self._rects.pop(idx))
+            idx = rect.collidelist(self._rects)
+        self._rects.append(rect)
+
+        if len(self._rects) > DirtyRegions.MAX_RECTS:
+            self.invalidate()
+
+    def collect(self, bounds: Rect) -> list[Rect]:
+        '''Return the pending regions clipped to bounds and reset'''
+        if self._full:
+            rects = [Rect(bounds)]
+        else:
+            rects = [r.clip(bounds) for r in self._rects]
+            rects = [r for r in rects if r.w > 0 and r.h > 0]
+        self._rects.clear()
+        self._full = False
+        return rects
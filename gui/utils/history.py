@@ -1,28 +1,68 @@
 
-from typing import Callable, Generic, TypeVar
+from sys import getsizeof
+from time import monotonic
+from typing import Callable, Generic, Hashable, Literal, TypeVar
 
 T = TypeVar('T')
 
 
 class Memento(Generic[T]):
+    __slots__ = (
+        'action', 'args', 'reverse_action', 'reverse_args',
+        'merge_key', 'time', 'nbytes')
+
     def __init__(
             self,
             action: Callable,
             args: tuple[T, ...],
             reverse_action: Callable,
-            reverse_args: tuple[T, ...]
+            reverse_args: tuple[T, ...],
+            merge_key: Hashable | None = None
             ) -> None:
         self.action = action
         self.args = args
         self.reverse_action = reverse_action
         self.reverse_args = reverse_args
+        # Consecutive mementos with the same key can be merged
+        self.merge_key = merge_key
+        self.time = monotonic()
+        self.nbytes = self.estimate_size()
+
+    def estimate_size(self) -> int:
+        '''Bytes of the memento and its arguments, not what they refer to'''
+        args, rargs = self.args, self.reverse_args
+        return (
+            getsizeof(self) + getsizeof(args) + getsizeof(rargs)
+            + sum(map(getsizeof, args)) + sum(map(getsizeof, rargs)))
 
 
 class History:
+    '''Undoable actions, the oldest are dropped past the limits
 
-    def __init__(self) -> None:
+    Actions done with the same merge_key less than MERGE_SECONDS apart
+    become a single memento, like a key held to move a token. Actions
+    done between begin and commit are undone and redone together.
+    '''
+    MERGE_SECONDS = 1.0
+
+    def __init__(
+            self, max_depth: int | None = None,
+            max_bytes: int | None = None) -> None:
         self._past: list[Memento] = []
         self._future: list[Memento] = []
+        self.max_depth = max_depth
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+        self.merged = 0
+        self.dropped = 0
+        # Only the memento of the last do can be merged
+        self._mergeable = False
+        # Mementos of the open transactions, innermost last
+        self._groups: list[list[Memento]] = []
+        # Called with ('do', memento, merged), ('undo' | 'redo', memento)
+        self.listeners: list[Callable[
+            [Literal['do', 'undo', 'redo'], Memento, bool], None]] = []
 
     def get_n_undoable(self) -> int:
         return len(self._past)
@@ -32,21 +72,166 @@ class History:
 
     def do(
             self, action: Callable, aargs: tuple,
-            rev_action: Callable, rargs: tuple) -> Memento:
-        memento = Memento(action, aargs, rev_action, rargs)
+            rev_action: Callable, rargs: tuple,
+            merge_key: Hashable | None = None,
+            merge: bool | None = None) -> Memento:
+        '''Apply action and record it
+
+        merge forces merging with the last memento or not, by default it
+        depends on the merge_key and the time since the last one.
+        '''
+        if self._groups:
+            memento = Memento(action, aargs, rev_action, rargs)
+            memento.action(*memento.args)
+            self._groups[-1].append(memento)
+            return memento
+
+        last = self._past[-1] if self._mergeable else None
+        if merge is None:
+            merge = (
+                last is not None and merge_key is not None
+                and last.merge_key == merge_key
+                and monotonic() - last.time < History.MERGE_SECONDS)
+        if merge and last is not None:
+            # Same reverse, the newest arguments
+            action(*aargs)
+            self.nbytes -= last.nbytes
+            last.action, last.args = action, aargs
+            last.time = monotonic()
+            last.nbytes = last.estimate_size()
+            self.nbytes += last.nbytes
+            self.merged += 1
+            self._notify('do', last, True)
+            return last
+
+        memento = Memento(action, aargs, rev_action, rargs, merge_key)
         memento.action(*memento.args)
+        self._push(memento)
+        self._notify('do', memento)
+        return memento
+
+    def _push(self, memento: Memento):
         self._past.append(memento)
-        self._future.clear()
+        self.nbytes += memento.nbytes
+        self._clear_future()
+        self._mergeable = True
+        self._trim()
+
+    # Transactions
+
+    @property
+    def in_transaction(self) -> bool:
+        return bool(self._groups)
+
+    def begin(self):
+        '''Start recording actions as a single one, can be nested'''
+        self._groups.append([])
+
+    def commit(self) -> Memento | None:
+        '''Record the actions since begin, None if there were none'''
+        group = self._groups.pop()
+        if self._groups:
+            # Part of the outer transaction
+            self._groups[-1].extend(group)
+            return None
+        if not group:
+            return None
+
+        memento = History.grouped(group)
+        self._push(memento)
+        self._notify('do', memento)
+        return memento
+
+    def rollback(self):
+        '''Undo the actions since begin without recording them'''
+        History._undo_all(self._groups.pop())
+
+    @staticmethod
+    def grouped(group: list[Memento]) -> Memento:
+        '''Memento doing and undoing the group as a single action'''
+        memento = Memento(
+            History._do_all, (group, ), History._undo_all, (group, ))
+        memento.nbytes += sum(m.nbytes for m in group)
         return memento
 
+    @staticmethod
+    def group_of(memento: Memento) -> list[Memento] | None:
+        '''Mementos of a committed transaction, None for single ones'''
+        if memento.action is History._do_all:
+            return memento.args[0]
+        return None
+
+    @staticmethod
+    def _do_all(group: list[Memento]):
+        for memento in group:
+            memento.action(*memento.args)
+
+    @staticmethod
+    def _undo_all(group: list[Memento]):
+        for memento in reversed(group):
+            memento.reverse_action(*memento.reverse_args)
+
+    # Undo and redo
+
     def redo(self) -> Memento:
+        assert not self._groups, 'Redo inside a transaction'
         memento = self._future.pop()
         self._past.append(memento)
         memento.action(*memento.args)
+        self._mergeable = False
+        self._notify('redo', memento)
         return memento
 
     def undo(self) -> Memento:
+        assert not self._groups, 'Undo inside a transaction'
         memento = self._past.pop()
         self._future.append(memento)
         memento.reverse_action(*memento.reverse_args)
+        self._mergeable = False
+        self._notify('undo', memento)
         return memento
+
+    def _notify(
+            self, kind: Literal['do', 'undo', 'redo'], memento: Memento,
+            merged: bool = False):
+        for listener in self.listeners:
+            listener(kind, memento, merged)
+
+    def clear(self):
+        self._past.clear()
+        self._clear_future()
+        self.nbytes = 0
+        self._mergeable = False
+
+    def _clear_future(self):
+        self.nbytes -= sum(m.nbytes for m in self._future)
+        self._future.clear()
+
+    def _trim(self):
+        '''Drop the oldest mementos over the limits, keeping the last one'''
+        drop = 0
+        if self.max_depth is not None:
+            drop = max(0, len(self._past) - self.max_depth)
+        if self.max_bytes is not None:
+            nbytes = self.nbytes - sum(m.nbytes for m in self._past[:drop])
+            while drop < len(self._past) - 1 and nbytes > self.max_bytes:
+                nbytes -= self._past[drop].nbytes
+                drop += 1
+        drop = min(drop, len(self._past) - 1)
+        if drop <= 0:
+            return
+
+        self.nbytes -= sum(m.nbytes for m in self._past[:drop])
+        del self._past[:drop]
+        self.dropped += drop
+
+    def stats(self) -> dict[str, int | None]:
+        return {
+            'undoable': len(self._past),
+            'redoable': len(self._future),
+            'bytes': self.nbytes,
+            'max_depth': self.max_depth,
+            'max_bytes': self.max_bytes,
+            'merged': self.merged,
+            'dropped': self.dropped,
+        }
@@ -5,10 +5,19 @@ import pygame as pg
 from pygame import Surface
 
 from gui.files import image_dir
+from gui.utils.cache import LRUCache
+
+
+def surface_bytes(surface: Surface) -> int:
+    return surface.get_bytesize() * surface.get_width() * surface.get_height()
 
 
 class ImageUtils:
-    _cache: dict[Path, Surface] = dict()
+    IMAGE_CACHE_BYTES = 256 * 1024 * 1024
+
+    # Decoded images by (resolved path, modification time)
+    _cache: LRUCache[tuple[Path, int], Surface] = LRUCache(
+        IMAGE_CACHE_BYTES, surface_bytes)
     _circular_masks: dict[float, Surface] = dict()
 
     @staticmethod
@@ -26,27 +35,47 @@ class ImageUtils:
         ImageUtils._circular_masks[diameter] = mask
         return mask.copy()
 
+    @staticmethod
+    def image_key(image_path: Path) -> tuple[Path, int]:
+        '''Identifies the current version of the image file'''
+        image_path = image_dir().joinpath(image_path).resolve()
+        assert image_path.is_file(), f'Image path "{image_path}" not found'
+        return image_path, image_path.stat().st_mtime_ns
+
     @staticmethod
     def load(image_path: Path) -> Surface:
-        image_path = image_dir().joinpath(image_path)
-        _cached = ImageUtils._cache.get(image_path)
+        '''Decoded image, shared between callers so it must not be modified'''
+        key = ImageUtils.image_key(image_path)
+        image_path = key[0]
+        _cached = ImageUtils._cache.get(key)
         if _cached is not None:
             return _cached
 
-        assert isinstance(image_path, Path)
-        assert image_path.is_file(), f'Image path "{image_path}" not found'
-
-        img = pg.image.load(image_path).convert()
+        img = ImageUtils.decode(image_path)
+        ImageUtils._cache.put(key, img)
 
         return img
 
+    @staticmethod
+    def decode(image_path: Path) -> Surface:
+        '''Read the image from disk, without caching it'''
+        return pg.image.load(image_path).convert()
+
+    @staticmethod
+    def set_cache_budget(max_bytes: int):
+        ImageUtils._cache.set_max_bytes(max_bytes)
+
+    @staticmethod
+    def cache_stats() -> dict[str, int]:
+        return ImageUtils._cache.stats()
+
     @staticmethod
     def fit(
             image: Surface, new_size: tuple[float, float],
             symetric_crop: bool = True) -> Surface:
         cx, cy = image.get_size()
         if (cx, cy) == new_size:
-            return image
+            return image.copy()
 
         incline = cy / cx
         nx, ny = new_size
@@ -0,0 +1,50 @@
+
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class SpriteLoader:
+    '''Thread pool for image decoding and scaling
+
+    Pygame releases the GIL while loading and smoothscaling, so the
+    work runs in parallel. When disabled everything runs synchronously.
+    '''
+    MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+    enabled = True
+    _executor: ThreadPoolExecutor | None = None
+
+    @staticmethod
+    def _get_executor() -> ThreadPoolExecutor:
+        if SpriteLoader._executor is None:
+            SpriteLoader._executor = ThreadPoolExecutor(
+                SpriteLoader.MAX_WORKERS, 'sprite-loader')
+        return SpriteLoader._executor
+
+    @staticmethod
+    def submit(function: Callable[..., R], *args) -> Future[R]:
+        if SpriteLoader.enabled:
+            return SpriteLoader._get_executor().submit(function, *args)
+
+        future: Future[R] = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    @staticmethod
+    def map(function: Callable[[T], R], items: Iterable[T]) -> list[R]:
+        if SpriteLoader.enabled:
+            return list(SpriteLoader._get_executor().map(function, items))
+        return [function(i) for i in items]
+
+    @staticmethod
+    def shutdown():
+        if SpriteLoader._executor is not None:
+            SpriteLoader._executor.shutdown(cancel_futures=True)
+            SpriteLoader._executor = None
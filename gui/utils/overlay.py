@@ -0,0 +1,96 @@
+
+from threading import RLock
+
+import pygame as pg
+from pygame import Surface
+from pygame.font import Font
+
+from gui.utils.image import ImageUtils
+from gui.values import ImageShape
+
+Color = tuple[int, int, int] | tuple[int, int, int, int]
+
+
+class Overlays:
+    '''Status and team decorations, drawn once for every size'''
+    # Font rendering is not thread safe
+    _font_lock = RLock()
+    _fonts: dict[int, Font] = dict()
+    _glyphs: dict[tuple[str, int, int], Surface] = dict()
+    _crosses: dict[tuple[int, int], Surface] = dict()
+    _auras: dict[
+        tuple[int, int, ImageShape, Color, int | None], Surface] = dict()
+
+    @staticmethod
+    def font(size: int) -> Font:
+        with Overlays._font_lock:
+            _cached = Overlays._fonts.get(size)
+            if _cached is None:
+                _cached = pg.font.SysFont('roboto', size, True)
+                Overlays._fonts[size] = _cached
+            return _cached
+
+    @staticmethod
+    def glyph(letter: str, x: int, y: int) -> Surface:
+        '''Translucent letter centered over a (x, y) image'''
+        key = (letter, x, y)
+        _cached = Overlays._glyphs.get(key)
+        if _cached is not None:
+            return _cached
+
+        with Overlays._font_lock:
+            s = Overlays.font(y).render(
+                letter, True, (0, 0, 0), (250, 250, 250))
+        s.set_alpha(100)
+        s = ImageUtils.fit(s, (x//1.5, y//1.5))
+
+        Overlays._glyphs[key] = s
+        return s
+
+    @staticmethod
+    def cross(x: int, y: int) -> Surface:
+        key = (x, y)
+        _cached = Overlays._crosses.get(key)
+        if _cached is not None:
+            return _cached
+
+        surface = Surface((x, y), pg.SRCALPHA)
+        thick = round((x + y) / 2 * 0.08)
+        offset = (x + y) / 2 * 0.1
+        pg.draw.line(
+            surface, (0, 0, 0), (offset, offset),
+            (x - offset, y - offset), thick)
+        pg.draw.line(
+            surface, (0, 0, 0), (offset, y - offset),
+            (x - offset, offset), thick)
+
+        Overlays._crosses[key] = surface
+        return surface
+
+    @staticmethod
+    def placeholder(x: int, y: int, shape: ImageShape) -> Surface:
+        '''Stand-in for a sprite that is still being loaded'''
+        return Overlays.aura(x, y, shape, (128, 128, 128, 96), 0)
+
+    @staticmethod
+    def aura(
+            x: int, y: int, shape: ImageShape, color: Color,
+            thick: int | None = None) -> Surface:
+        '''Ring around the image, filled if thick is 0'''
+        key = (x, y, shape, color, thick)
+        _cached = Overlays._auras.get(key)
+        if _cached is not None:
+            return _cached
+
+        surface = Surface((x, y), pg.SRCALPHA)
+        if thick is None:
+            thick = round((x + y) / 2 * 0.06)
+        if shape == ImageShape.CIRCULAR:
+            rad = min(x, y) // 2
+            pg.draw.circle(surface, color, (x // 2, y // 2), rad, thick)
+        else:
+            rad = -1
+            pg.draw.rect(surface, color, (0, 0, x, y), thick, rad)
+
+        Overlays._auras[key] = surface
+        return surface
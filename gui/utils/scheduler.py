@@ -0,0 +1,64 @@
+
+from collections import deque
+from time import perf_counter
+
+import pygame as pg
+from pygame import event, NOEVENT
+
+
+class FrameScheduler:
+    '''Blocks on the event queue when idle, limits the rate when busy'''
+    STATS_WINDOW = 1.0  # seconds
+
+    def __init__(
+            self, busy_fps: int = 60,
+            idle_timeout: int = 1000, pending_timeout: int = 30) -> None:
+        self.busy_fps = busy_fps
+        # Milliseconds to wait for an event, with and without pending work
+        self.idle_timeout = idle_timeout
+        self.pending_timeout = pending_timeout
+
+        self._clock = pg.time.Clock()
+        # (end time, frame duration, idle time) of the recent frames
+        self._frames: deque[tuple[float, float, float]] = deque()
+        self._last = perf_counter()
+
+    def wait(self, busy: bool, pending: bool = False) -> list[event.Event]:
+        '''Events for the next frame
+
+        When busy the loop runs at busy_fps, otherwise it sleeps until
+        an event arrives or, if there is pending work, a short timeout.
+        '''
+        if busy:
+            self._clock.tick(self.busy_fps)
+            idle = (self._clock.get_time() - self._clock.get_rawtime()) / 1000
+            events = event.get()
+        else:
+            start = perf_counter()
+            first = event.wait(
+                self.pending_timeout if pending else self.idle_timeout)
+            idle = perf_counter() - start
+            events = event.get()
+            if first.type != NOEVENT:
+                events.insert(0, first)
+            # Keep the clock from limiting the first busy frame
+            self._clock.tick()
+
+        now = perf_counter()
+        self._frames.append((now, now - self._last, idle))
+        self._last = now
+        while self._frames[0][0] < now - FrameScheduler.STATS_WINDOW:
+            self._frames.popleft()
+        return events
+
+    @property
+    def fps(self) -> float:
+        '''Frames per second over the last STATS_WINDOW'''
+        total = sum(f[1] for f in self._frames)
+        return len(self._frames) / total if total > 0 else 0.0
+
+    @property
+    def idle_percent(self) -> float:
+        total = sum(f[1] for f in self._frames)
+        idle = sum(f[2] for f in self._frames)
+        return min(100.0, 100 * idle / total) if total > 0 else 0.0
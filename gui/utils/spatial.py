@@ -0,0 +1,75 @@
+
+from math import ceil, floor
+from typing import Generic, Hashable, TypeVar
+
+T = TypeVar('T', bound=Hashable)
+
+Cell = tuple[int, int]
+
+
+class SpatialHash(Generic[T]):
+    '''Uniform grid of buckets keyed by cell coordinates'''
+
+    def __init__(self) -> None:
+        self._buckets: dict[Cell, set[T]] = dict()
+        self._cells: dict[T, list[Cell]] = dict()
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __contains__(self, item: T) -> bool:
+        return item in self._cells
+
+    @staticmethod
+    def _covered(
+            x0: float, y0: float, x1: float, y1: float) -> list[Cell]:
+        return [
+            (cx, cy)
+            for cx in range(floor(x0), max(ceil(x1), floor(x0) + 1))
+            for cy in range(floor(y0), max(ceil(y1), floor(y0) + 1))]
+
+    def insert(self, item: T, bounds: tuple[float, float, float, float]):
+        '''Add item covering bounds (x0, y0, x1, y1) in cell units'''
+        if item in self._cells:
+            self.remove(item)
+
+        cells = SpatialHash._covered(*bounds)
+        for cell in cells:
+            bucket = self._buckets.get(cell)
+            if bucket is None:
+                bucket = self._buckets[cell] = set()
+            bucket.add(item)
+        self._cells[item] = cells
+
+    def remove(self, item: T):
+        for cell in self._cells.pop(item, ()):
+            bucket = self._buckets[cell]
+            bucket.discard(item)
+            if not bucket:
+                del self._buckets[cell]
+
+    def clear(self):
+        self._buckets.clear()
+        self._cells.clear()
+
+    def query(self, x: float, y: float) -> set[T]:
+        '''Items whose cells contain the point (x, y) in cell units'''
+        return set(self._buckets.get((floor(x), floor(y)), ()))
+
+    def query_area(
+            self, x0: float, y0: float, x1: float, y1: float) -> set[T]:
+        '''Items whose cells overlap the area (x0, y0, x1, y1) in cell units'''
+        cx0, cy0 = floor(x0), floor(y0)
+        cx1, cy1 = max(ceil(x1), cx0 + 1), max(ceil(y1), cy0 + 1)
+
+        found: set[T] = set()
+        if (cx1 - cx0) * (cy1 - cy0) > len(self._buckets):
+            # Large areas, cheaper to check the occupied cells
+            for (cx, cy), bucket in self._buckets.items():
+                if cx0 <= cx < cx1 and cy0 <= cy < cy1:
+                    found.update(bucket)
+        else:
+            for cx in range(cx0, cx1):
+                for cy in range(cy0, cy1):
+                    found.update(self._buckets.get((cx, cy), ()))
+        return found
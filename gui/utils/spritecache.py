@@ -0,0 +1,167 @@
+
+import os
+import struct
+from collections import OrderedDict
+from hashlib import sha1
+from pathlib import Path
+from threading import RLock, get_ident
+
+import pygame as pg
+from pygame import Surface
+
+from gui.files import cache_dir
+
+
+class SpriteCache:
+    '''Drawn sprites kept on disk between sessions, as raw RGBA pixels
+
+    Entries are named after a hash of the source image contents and the
+    drawing parameters, so a changed image never finds old sprites.
+    Reading one is a file read and pg.image.frombuffer, no decoding nor
+    scaling. The least recently used are removed past MAX_BYTES.
+    '''
+    DIRNAME = 'sprites'
+    EXTENSION = '.rgba'
+    MAX_BYTES = 256 * 1024 * 1024
+    # Change when the sprites are drawn differently
+    VERSION = 1
+    # Magic, width and height before the pixels
+    HEADER = struct.Struct('<4sII')
+    MAGIC = b'RGBA'
+
+    enabled = True
+
+    _lock = RLock()
+    # Entry sizes by path, least recently used first, read on first use
+    _entries: OrderedDict[Path, int] | None = None
+    _nbytes = 0
+    # Contents hashes by image key
+    _hashes: dict[tuple[Path, int], str] = dict()
+
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    @staticmethod
+    def folder() -> Path:
+        return cache_dir().joinpath(SpriteCache.DIRNAME)
+
+    @staticmethod
+    def content_hash(image_key: tuple[Path, int]) -> str:
+        '''Hash of the image file, read once per version of the file'''
+        digest = SpriteCache._hashes.get(image_key)
+        if digest is None:
+            digest = sha1(image_key[0].read_bytes()).hexdigest()
+            SpriteCache._hashes[image_key] = digest
+        return digest
+
+    @staticmethod
+    def _path(image_key: tuple[Path, int], params: tuple) -> Path:
+        values = ':'.join(str(getattr(v, 'value', v)) for v in params)
+        name = sha1(
+            f'{SpriteCache.VERSION}:{SpriteCache.content_hash(image_key)}:'
+            f'{values}'.encode()).hexdigest()
+        return SpriteCache.folder().joinpath(name + SpriteCache.EXTENSION)
+
+    @staticmethod
+    def _index() -> OrderedDict[Path, int]:
+        if SpriteCache._entries is None:
+            folder = SpriteCache.folder()
+            folder.mkdir(parents=True, exist_ok=True)
+            files = [
+                (f.stat(), f)
+                for f in folder.glob(f'*{SpriteCache.EXTENSION}')]
+            files.sort(key=lambda sf: sf[0].st_mtime_ns)
+            SpriteCache._entries = OrderedDict(
+                (f, s.st_size) for s, f in files)
+            SpriteCache._nbytes = sum(s.st_size for s, _ in files)
+        return SpriteCache._entries
+
+    @staticmethod
+    def get(image_key: tuple[Path, int], params: tuple) -> Surface | None:
+        '''Sprite of the image drawn with params, None if not stored'''
+        if not SpriteCache.enabled:
+            return None
+        path = SpriteCache._path(image_key, params)
+        with SpriteCache._lock:
+            entries = SpriteCache._index()
+            if path not in entries:
+                SpriteCache.misses += 1
+                return None
+            entries.move_to_end(path)
+
+        try:
+            data = path.read_bytes()
+            magic, w, h = SpriteCache.HEADER.unpack_from(data)
+            assert magic == SpriteCache.MAGIC
+            pixels = memoryview(data)[SpriteCache.HEADER.size:]
+            surface = pg.image.frombuffer(pixels, (w, h), 'RGBA')
+            # In the display format, which owns its pixels
+            surface = surface.convert_alpha()
+            # The order of the entries in the next session
+            os.utime(path)
+        except (OSError, ValueError, struct.error, AssertionError):
+            SpriteCache._forget(path)
+            SpriteCache.misses += 1
+            return None
+
+        SpriteCache.hits += 1
+        return surface
+
+    @staticmethod
+    def put(image_key: tuple[Path, int], params: tuple, surface: Surface):
+        if not SpriteCache.enabled:
+            return
+        path = SpriteCache._path(image_key, params)
+        data = SpriteCache.HEADER.pack(
+            SpriteCache.MAGIC, *surface.get_size()
+        ) + pg.image.tobytes(surface, 'RGBA')
+
+        tmp = path.with_name(f'.{path.name}.{get_ident()}.tmp')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return
+
+        with SpriteCache._lock:
+            entries = SpriteCache._index()
+            SpriteCache._nbytes += len(data) - entries.pop(path, 0)
+            entries[path] = len(data)
+
+            while SpriteCache._nbytes > SpriteCache.MAX_BYTES and entries:
+                oldest, size = entries.popitem(last=False)
+                SpriteCache._nbytes -= size
+                oldest.unlink(missing_ok=True)
+                SpriteCache.evictions += 1
+
+    @staticmethod
+    def _forget(path: Path):
+        with SpriteCache._lock:
+            entries = SpriteCache._index()
+            SpriteCache._nbytes -= entries.pop(path, 0)
+            path.unlink(missing_ok=True)
+
+    @staticmethod
+    def clear():
+        '''Remove every stored sprite, like after changing how they look'''
+        with SpriteCache._lock:
+            for path in SpriteCache._index():
+                path.unlink(missing_ok=True)
+            SpriteCache._entries = None
+            SpriteCache._nbytes = 0
+            SpriteCache._hashes.clear()
+
+    @staticmethod
+    def stats() -> dict[str, int]:
+        with SpriteCache._lock:
+            return {
+                'items': len(SpriteCache._index()),
+                'bytes': SpriteCache._nbytes,
+                'max_bytes': SpriteCache.MAX_BYTES,
+                'hits': SpriteCache.hits,
+                'misses': SpriteCache.misses,
+                'evictions': SpriteCache.evictions,
+            }
@@ -0,0 +1,127 @@
+
+from typing import Generic, Hashable, Iterable, Iterator, TypeVar
+
+T = TypeVar('T', bound=Hashable)
+
+
+class EntityStore(Generic[T]):
+    '''Items by stable integer id, stacked by depth
+
+    Every item has a unique depth, the biggest one is on top. Bringing
+    to the front and restoring a previous depth are O(1), the ordered
+    list is sorted again only after a change.
+    '''
+
+    def __init__(self, items: Iterable[T] = ()) -> None:
+        self._items: dict[int, T] = dict()
+        self._ids: dict[T, int] = dict()
+        self._depths: dict[int, int] = dict()
+        self._next_id = 0
+        self._top = 0
+        # Top first, None when it has to be sorted again
+        self._order: list[T] | None = None
+
+        # The first item ends on top
+        for item in reversed(list(items)):
+            self.add(self.new_id(), item)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item: T) -> bool:
+        return item in self._ids
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.ordered())
+
+    def new_id(self) -> int:
+        '''Reserve an id, so the commands can refer to it before adding'''
+        self._next_id += 1
+        return self._next_id
+
+    def id_of(self, item: T) -> int:
+        '''Id of item, -1 if it is not stored'''
+        return self._ids.get(item, -1)
+
+    def get(self, item_id: int) -> T:
+        return self._items[item_id]
+
+    def depth(self, item_id: int) -> int:
+        return self._depths[item_id]
+
+    def add(self, item_id: int, item: T, depth: int | None = None):
+        '''Store item under item_id, on top unless a depth is given'''
+        assert item_id not in self._items, f'Repeated id {item_id}'
+        self._next_id = max(self._next_id, item_id)
+        if depth is None:
+            self._top += 1
+            depth = self._top
+        self._top = max(self._top, depth)
+
+        self._items[item_id] = item
+        self._ids[item] = item_id
+        self._depths[item_id] = depth
+        self._order = None
+
+    def counters(self) -> tuple[int, int]:
+        '''Last id and top depth given, to go on from them in relabel'''
+        return self._next_id, self._top
+
+    def relabel(
+            self, labels: dict[T, tuple[int, int]],
+            counters: tuple[int, int] = (0, 0)):
+        '''Give the stored items the (id, depth) pairs of a previous store'''
+        assert labels.keys() == self._ids.keys()
+        self._items = {i: item for item, (i, _) in labels.items()}
+        self._ids = {item: i for item, (i, _) in labels.items()}
+        self._depths = {i: depth for i, depth in labels.values()}
+        self._next_id = max(max(self._items, default=0), counters[0])
+        self._top = max(max(self._depths.values(), default=0), counters[1])
+        self._order = None
+
+    def remove(self, item_id: int) -> int:
+        '''Remove the item, return its depth to restore it later'''
+        item = self._items.pop(item_id)
+        del self._ids[item]
+        self._order = None
+        return self._depths.pop(item_id)
+
+    def replace(self, item_id: int, item: T):
+        '''Put item in place of the one under item_id, same depth'''
+        del self._ids[self._items[item_id]]
+        self._items[item_id] = item
+        self._ids[item] = item_id
+        self._order = None
+
+    def set_depth(self, item_id: int, depth: int):
+        if self._depths[item_id] == depth:
+            return
+        self._depths[item_id] = depth
+        self._top = max(self._top, depth)
+        self._order = None
+
+    def bring_to_front(self, item_id: int) -> int:
+        '''Move the item on top, return its previous depth'''
+        old = self._depths[item_id]
+        if old != self._top:
+            self._top += 1
+            self.set_depth(item_id, self._top)
+        return old
+
+    def ordered(self) -> list[T]:
+        '''Every item, top first. Must not be modified'''
+        if self._order is None:
+            depths, ids = self._depths, self._ids
+            self._order = sorted(
+                self._items.values(), key=lambda i: depths[ids[i]],
+                reverse=True)
+        return self._order
+
+    def bottom_up(self, items: Iterable[T]) -> list[T]:
+        '''Some stored items, bottom first'''
+        depths, ids = self._depths, self._ids
+        return sorted(items, key=lambda i: depths[ids[i]])
+
+    def topmost(self, items: Iterable[T]) -> T | None:
+        depths, ids = self._depths, self._ids
+        return max(items, key=lambda i: depths[ids[i]], default=None)
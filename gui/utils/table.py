@@ -0,0 +1,148 @@
+
+from enum import Enum
+from typing import Any, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # Optional, the encounter works without it
+    np = None
+
+from gui.values import CreatureStatus, CreatureTeam, ImageShape
+
+# Enum members as small integers
+_CODES: dict[Enum, int] = {
+    member: code
+    for enum in (ImageShape, CreatureStatus, CreatureTeam)
+    for code, member in enumerate(enum)}
+
+
+class EntityTable:
+    '''Entity state in NumPy columns, one row per entity id
+
+    A copy of the models kept by the encounter, so operations over every
+    entity run as array operations. Removing moves the last row into
+    the gap, rows are not in any particular order.
+    '''
+    INITIAL_CAPACITY = 64
+    NO_CODE = -1  # Team and status of items
+
+    def __init__(self) -> None:
+        assert np is not None, 'EntityTable requires numpy'
+        self._rows: dict[int, int] = dict()
+        self._n = 0
+
+        capacity = EntityTable.INITIAL_CAPACITY
+        self._ids = np.zeros(capacity, np.int64)
+        self._x = np.zeros(capacity, np.int64)
+        self._y = np.zeros(capacity, np.int64)
+        self._size = np.zeros(capacity, np.float64)
+        self._shape = np.zeros(capacity, np.int8)
+        self._team = np.zeros(capacity, np.int8)
+        self._status = np.zeros(capacity, np.int8)
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    def _columns(self) -> list:
+        return [
+            self._ids, self._x, self._y, self._size,
+            self._shape, self._team, self._status]
+
+    def _grow(self):
+        (
+            self._ids, self._x, self._y, self._size,
+            self._shape, self._team, self._status
+        ) = [np.resize(c, 2 * len(c)) for c in self._columns()]
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __contains__(self, entity_id: int) -> bool:
+        return entity_id in self._rows
+
+    # Rows
+
+    def _row(self, entity_id: int) -> int:
+        '''Row of entity_id, added at the end if it has none'''
+        row = self._rows.get(entity_id)
+        if row is None:
+            if self._n == len(self._ids):
+                self._grow()
+            row = self._rows[entity_id] = self._n
+            self._n += 1
+            self._ids[row] = entity_id
+        return row
+
+    def set(self, entity_id: int, model: Any):
+        '''Add or update the row of entity_id with the model values'''
+        row = self._row(entity_id)
+
+        self._x[row] = model.x
+        self._y[row] = model.y
+        self._size[row] = model.size
+        self._shape[row] = _CODES[model.shape]
+        team = getattr(model, 'team', None)
+        self._team[row] = EntityTable.NO_CODE if team is None else _CODES[team]
+        status = getattr(model, 'status', None)
+        self._status[row] = (
+            EntityTable.NO_CODE if status is None else _CODES[status])
+
+    def set_many(self, entity_ids: Sequence[int], models: Sequence[Any]):
+        '''Like set for every pair, a single assignment per column'''
+        rows = [self._row(i) for i in entity_ids]
+        self._x[rows] = [m.x for m in models]
+        self._y[rows] = [m.y for m in models]
+        self._size[rows] = [m.size for m in models]
+        self._shape[rows] = [_CODES[m.shape] for m in models]
+        self._team[rows] = [
+            _CODES.get(getattr(m, 'team', None), EntityTable.NO_CODE)
+            for m in models]
+        self._status[rows] = [
+            _CODES.get(getattr(m, 'status', None), EntityTable.NO_CODE)
+            for m in models]
+
+    def remove(self, entity_id: int):
+        row = self._rows.pop(entity_id, None)
+        if row is None:
+            return
+        last = self._n - 1
+        if row != last:
+            for column in self._columns():
+                column[row] = column[last]
+            self._rows[int(self._ids[row])] = row
+        self._n = last
+
+    def clear(self):
+        self._rows.clear()
+        self._n = 0
+
+    # Queries, every result is a list of entity ids
+
+    def _bounds(self):
+        '''(x0, y0, x1, y1) columns in cell units, like get_bounds'''
+        n = self._n
+        size = self._size[:n]
+        offset = np.where(size < 1, size / 2, 0)
+        x0 = self._x[:n] + offset
+        y0 = self._y[:n] + offset
+        return x0, y0, x0 + size, y0 + size
+
+    def in_area(
+            self, x0: float, y0: float, x1: float, y1: float) -> list[int]:
+        '''Entities overlapping or touching the area, in cell units'''
+        bx0, by0, bx1, by1 = self._bounds()
+        mask = (bx0 <= x1) & (bx1 >= x0) & (by0 <= y1) & (by1 >= y0)
+        return self._ids[:self._n][mask].tolist()
+
+    def outside(self, max_x: int, max_y: int) -> tuple[list[int], list, list]:
+        '''Entities not fully in the grid, old and clamped positions'''
+        n = self._n
+        x, y = self._x[:n], self._y[:n]
+        extent = np.ceil(self._size[:n]).astype(np.int64)
+        new_x = np.maximum(0, np.minimum(max_x - extent, x))
+        new_y = np.maximum(0, np.minimum(max_y - extent, y))
+        moved = (new_x != x) | (new_y != y)
+        old = list(zip(x[moved].tolist(), y[moved].tolist()))
+        new = list(zip(new_x[moved].tolist(), new_y[moved].tolist()))
+        return self._ids[:n][moved].tolist(), old, new
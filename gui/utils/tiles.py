@@ -0,0 +1,249 @@
+
+import json
+import mmap
+import os
+import struct
+from hashlib import sha1
+from math import ceil, floor
+from pathlib import Path
+
+import pygame as pg
+from pygame import Rect, Surface
+
+from gui.utils.cache import LRUCache
+from gui.utils.image import ImageUtils, surface_bytes
+
+
+class TilePyramid:
+    '''Image halved in power of two levels, split in tiles cached on disk
+
+    Level L is the image downscaled by 2**L. Every level is built once
+    from the decoded image and afterwards only the visible tiles are
+    read, so drawing costs depend on the target size, not the image.
+
+    Levels are stored as raw pixels after a small header. They are
+    memory mapped and used as surfaces without copying, tiles are just
+    subsurfaces: only the pages seen are read, and they are shared with
+    any other program showing the same background. Mapped files can't
+    be replaced everywhere, so every build writes new ones, named after
+    a build id kept in the meta file.
+    '''
+    TILE_SIZE = 512
+    LEVEL_EXTENSION = '.raw'
+    LEVEL_FORMAT = 'RGB'
+    # Magic, width and height before the pixels
+    HEADER = struct.Struct('<4sII')
+    MAGIC = b'EMPX'
+    META_FILENAME = 'meta.json'
+    TILE_CACHE_BYTES = 128 * 1024 * 1024
+
+    # Scaled tiles by (pyramid, level, tile x, tile y, scaled size)
+    _tiles: LRUCache[tuple, Surface] = LRUCache(
+        TILE_CACHE_BYTES, surface_bytes)
+    # Mapped levels by (pyramid and build, level)
+    _mapped: dict[tuple[str, int], Surface] = dict()
+
+    def __init__(self, image_path: Path, cache_root: Path) -> None:
+        self.source = ImageUtils.image_key(image_path)[0]
+        self.folder = TilePyramid.folder_for(image_path, cache_root)
+        self.build = ''
+        self.key = self.folder.name
+
+        self.size: tuple[int, int] = (0, 0)
+        self.levels: list[tuple[int, int]] = []
+        if not self._load_meta():
+            self._build()
+
+    # Disk cache
+
+    @staticmethod
+    def folder_for(image_path: Path, cache_root: Path) -> Path:
+        '''Where the tiles of the current version of the image are'''
+        source, mtime = ImageUtils.image_key(image_path)
+        key = sha1(f'{source}:{mtime}'.encode()).hexdigest()[:24]
+        return cache_root.joinpath(key)
+
+    def cached_files(self, first_level: int = 0) -> list[Path]:
+        '''Levels from first_level on and the meta file, which goes last'''
+        def files() -> list[Path]:
+            return [
+                self._level_path(level)
+                for level in range(first_level, len(self.levels))
+            ] + [self.folder.joinpath(TilePyramid.META_FILENAME)]
+
+        # A rebuild writes the levels under a new build id
+        if not all(f.is_file() for f in files()):
+            self._build()
+        return files()
+
+    def _level_path(self, level: int) -> Path:
+        return self.folder.joinpath(
+            f'{level}-{self.build}{TilePyramid.LEVEL_EXTENSION}')
+
+    def _load_meta(self) -> bool:
+        try:
+            with self.folder.joinpath(TilePyramid.META_FILENAME).open() as f:
+                meta = json.load(f)
+            assert meta['tile'] == TilePyramid.TILE_SIZE
+            assert meta['format'] == TilePyramid.LEVEL_FORMAT
+            self.size = tuple(meta['size'])  # type:ignore
+            self.levels = [tuple(lv) for lv in meta['levels']]  # type:ignore
+            self.build = meta['build']
+        except (OSError, ValueError, KeyError, TypeError, AssertionError):
+            return False
+        self.key = f'{self.folder.name}-{self.build}'
+        return True
+
+    def _build(self):
+        tile = TilePyramid.TILE_SIZE
+        self.folder.mkdir(parents=True, exist_ok=True)
+        # The levels of the last build are not read again
+        for level in range(len(self.levels)):
+            TilePyramid._mapped.pop((self.key, level), None)
+        self.build = os.urandom(4).hex()
+        self.key = f'{self.folder.name}-{self.build}'
+
+        image = ImageUtils.decode(self.source)
+        self.size = image.get_size()
+        self.levels = []
+        while True:
+            w, h = image.get_size()
+            with self._level_path(len(self.levels)).open('wb') as f:
+                f.write(TilePyramid.HEADER.pack(TilePyramid.MAGIC, w, h))
+                # In bands of rows, not the whole level copied at once
+                for top in range(0, h, tile):
+                    band = image.subsurface(0, top, w, min(tile, h - top))
+                    f.write(pg.image.tobytes(band, TilePyramid.LEVEL_FORMAT))
+            self.levels.append((w, h))
+
+            if max(w, h) <= tile:
+                break
+            image = pg.transform.smoothscale(
+                image, (max(1, ceil(w / 2)), max(1, ceil(h / 2))))
+
+        # Written last, a pyramid without meta is rebuilt
+        meta = self.folder.joinpath(TilePyramid.META_FILENAME)
+        tmp = meta.with_suffix('.tmp')
+        with tmp.open('w') as f:
+            json.dump({
+                'tile': tile,
+                'format': TilePyramid.LEVEL_FORMAT,
+                'size': self.size,
+                'levels': self.levels,
+                'build': self.build,
+            }, f)
+        os.replace(tmp, meta)
+
+        # Those of other builds, unless another program still maps them
+        current = {self._level_path(lv) for lv in range(len(self.levels))}
+        for path in self.folder.glob(f'*{TilePyramid.LEVEL_EXTENSION}'):
+            if path not in current:
+                try:
+                    path.unlink()
+                except OSError:
+                    ...
+
+    def _map_level(self, level: int) -> Surface:
+        '''The level as a surface over its mapped file'''
+        key = (self.key, level)
+        surface = TilePyramid._mapped.get(key)
+        if surface is not None:
+            return surface
+
+        with self._level_path(level).open('rb') as f:
+            # Copy on write, so it is a writable buffer for pygame
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        try:
+            magic, w, h = TilePyramid.HEADER.unpack_from(mapped)
+            valid = (
+                magic == TilePyramid.MAGIC
+                and [w, h] == list(self.levels[level]))
+            if not valid:
+                raise ValueError(
+                    f'Level {level} of {self.folder} is not valid')
+        except (ValueError, struct.error):
+            mapped.close()
+            raise
+        surface = pg.image.frombuffer(
+            memoryview(mapped)[TilePyramid.HEADER.size:], (w, h),
+            TilePyramid.LEVEL_FORMAT)
+        TilePyramid._mapped[key] = surface
+        return surface
+
+    def _load_tile(self, level: int, tx: int, ty: int) -> Surface:
+        '''Part of the mapped level, must not be modified'''
+        tile = TilePyramid.TILE_SIZE
+        try:
+            surface = self._map_level(level)
+        except (OSError, ValueError, struct.error):
+            # The cache was cleared or cut meanwhile
+            self._build()
+            surface = self._map_level(level)
+        area = Rect(tx * tile, ty * tile, tile, tile).clip(surface.get_rect())
+        return surface.subsurface(area)
+
+    # Drawing
+
+    def get_size(self, scale: float) -> tuple[int, int]:
+        return round(self.size[0] * scale), round(self.size[1] * scale)
+
+    def level_for(self, scale: float) -> int:
+        '''Smallest level with at least the resolution needed for scale'''
+        level = 0
+        while level + 1 < len(self.levels) and scale * 2 ** (level + 1) <= 1:
+            level += 1
+        return level
+
+    def render(
+            self, target: Surface, scale: float,
+            origin: tuple[int, int] = (0, 0)):
+        '''Draw the image scaled by scale, origin at the target top left'''
+        tile = TilePyramid.TILE_SIZE
+        level = self.level_for(scale)
+        lw, lh = self.levels[level]
+        sw, sh = self.get_size(scale)
+        fx, fy = sw / lw, sh / lh
+
+        ox, oy = origin
+        visible = Rect(origin, target.get_size()).clip(Rect(0, 0, sw, sh))
+        if visible.w <= 0 or visible.h <= 0:
+            return
+
+        first_x = max(0, floor(visible.left / (tile * fx)))
+        last_x = min(ceil(lw / tile), ceil(visible.right / (tile * fx)))
+        first_y = max(0, floor(visible.top / (tile * fy)))
+        last_y = min(ceil(lh / tile), ceil(visible.bottom / (tile * fy)))
+
+        blits = []
+        for tx in range(first_x, last_x):
+            # Edges are rounded once so neighbouring tiles never overlap
+            left = round(tx * tile * fx)
+            right = round(min((tx + 1) * tile, lw) * fx)
+            for ty in range(first_y, last_y):
+                top = round(ty * tile * fy)
+                bottom = round(min((ty + 1) * tile, lh) * fy)
+                surf = self.get_tile(
+                    level, tx, ty, (right - left, bottom - top))
+                blits.append((surf, (left - ox, top - oy)))
+        target.blits(blits, False)
+
+    def get_tile(
+            self, level: int, tx: int, ty: int,
+            size: tuple[int, int]) -> Surface:
+        key = (self.key, level, tx, ty, size)
+        _cached = TilePyramid._tiles.get(key)
+        if _cached is not None:
+            return _cached
+
+        surf = self._load_tile(level, tx, ty)
+        if surf.get_size() != size and size[0] > 0 and size[1] > 0:
+            surf = pg.transform.smoothscale(surf, size)
+
+        TilePyramid._tiles.put(key, surf)
+        return surf
+
+    def get_surface(self, scale: float) -> Surface:
+        '''The whole image scaled, only for small images or exports'''
+        surf = Surface(self.get_size(scale))
+        self.render(surf, scale)
+        return surf
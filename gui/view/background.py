@@ -1,15 +1,47 @@
 
+from pathlib import Path
+
 from pygame import Surface
-from gui.model.base import BaseModel
-from gui.utils.image import ImageUtils
+from gui.files import cache_dir
 from gui.model.background import BackgroundModel
+from gui.utils.tiles import TilePyramid
 from gui.view.base import BaseView
 
 
 class BackgroundView(BaseView):
+    __slots__ = ('_pyramid', )
+
     _model: BackgroundModel
 
+    TILES_DIRNAME = 'tiles'
+
+    def __init__(self, model: BackgroundModel) -> None:
+        super().__init__(model)
+        self._pyramid: TilePyramid | None = None
+
+    def model_updated(self):
+        super().model_updated()
+        self._pyramid = None
+
+    @staticmethod
+    def tiles_root() -> Path:
+        return cache_dir().joinpath(BackgroundView.TILES_DIRNAME)
+
+    def get_pyramid(self) -> TilePyramid:
+        if self._pyramid is None:
+            self._pyramid = TilePyramid(
+                self._model.image_path, BackgroundView.tiles_root())
+        return self._pyramid
+
+    def get_size(self) -> tuple[int, int]:
+        '''Scaled size, known without decoding the image'''
+        return self.get_pyramid().get_size(self._model.scale)
+
+    def render_area(
+            self, target: Surface, zoom: float,
+            origin: tuple[int, int] = (0, 0)):
+        '''Draw the part of the background seen from origin at zoom'''
+        self.get_pyramid().render(target, self._model.scale * zoom, origin)
+
     def draw_surface(self) -> Surface:
-        surf = super().draw_surface()
-        surf = ImageUtils.scale(surf, self._model.scale)
-        return surf
+        return self.get_pyramid().get_surface(self._model.scale)
@@ -6,6 +6,8 @@ from gui.model.base import BaseModel
 
 
 class BaseView:
+    __slots__ = ('_model', '_surface')
+
     DEFAULT_BASE_SIZE = 100
 
     def __init__(self, model: BaseModel) -> None:
@@ -1,16 +1,20 @@
 
 from pygame import Surface
-import pygame as pg
 
-from gui.utils.image import ImageUtils
+from gui.utils.overlay import Overlays
 from gui.model.creature import CreatureModel
-from gui.values import CreatureStatus, CreatureTeam, ImageShape
+from gui.values import CreatureStatus, CreatureTeam
 from gui.view.entity import EntityView
 
 
 class CreatureView(EntityView):
+    __slots__ = ()
+
     _model: CreatureModel  # type:ignore
 
+    def sprite_key(self) -> tuple:
+        return super().sprite_key() + (self._model.status, self._model.team)
+
     def draw_surface(self) -> Surface:
         surface = super().draw_surface()
 
@@ -19,21 +23,11 @@ class CreatureView(EntityView):
             case CreatureStatus.ALIVE:
                 ...
             case CreatureStatus.SLEEP:
-                sf = pg.font.SysFont('roboto', y, True)
-                s = sf.render('S', True, (0, 0, 0), (250, 250, 250))
-                s.set_alpha(100)
-                s = ImageUtils.fit(s, (x//1.5, y//1.5))
+                s = Overlays.glyph('S', x, y)
                 w, h = s.get_size()
                 surface.blit(s, ((x-w) // 2, (y-h) // 2))
             case CreatureStatus.DEAD:
-                thick = round((x + y) / 2 * 0.08)
-                offset = (x + y) / 2 * 0.1
-                pg.draw.line(
-                    surface, (0, 0, 0), (offset, offset),
-                    (x - offset, y - offset), thick)
-                pg.draw.line(
-                    surface, (0, 0, 0), (offset, y - offset),
-                    (x - offset, offset), thick)
+                surface.blit(Overlays.cross(x, y), (0, 0))
             case _:
                 raise ValueError(
                     f'Status "{self._model.status.value}" not supported')
@@ -51,16 +45,7 @@ class CreatureView(EntityView):
                     f'Team "{self._model.team.value}" not supported')
 
         if aura is not None:
-            thick = round((x + y) / 2 * 0.06)
-            if self._model.shape == ImageShape.CIRCULAR:
-                rad = min(x, y) // 2
-                pg.draw.circle(
-                    surface, aura, (
-                        surface.get_width() // 2,
-                        surface.get_height() // 2),
-                    rad, thick)
-            else:
-                rad = -1
-                pg.draw.rect(surface, aura, (0, 0, x, y), thick, rad)
+            surface.blit(
+                Overlays.aura(x, y, self._model.shape, aura), (0, 0))
 
         return surface
@@ -1,19 +1,39 @@
 
+from concurrent.futures import Future
+from copy import copy
 
 from pygame import Surface
 
 from gui.values import ImageShape
-from gui.utils.image import ImageUtils
+from gui.utils.cache import LRUCache
+from gui.utils.image import ImageUtils, surface_bytes
+from gui.utils.loader import SpriteLoader
+from gui.utils.spritecache import SpriteCache
 from gui.model.entity import EntityModel
 from gui.view.base import BaseView
 
 
 class EntityView(BaseView):
+    __slots__ = ('_base_size', '_pending')
+
+    SPRITE_CACHE_BYTES = 64 * 1024 * 1024
+
+    # Rendered surfaces shared by every view with the same sprite_key
+    _sprites: LRUCache[tuple, Surface] = LRUCache(
+        SPRITE_CACHE_BYTES, surface_bytes)
+    # Sprites being drawn by the loader, by sprite_key
+    _drawing: dict[tuple, Future[Surface]] = dict()
+
     _model: EntityModel
 
     def __init__(self, model: EntityModel, base_size: float) -> None:
         super().__init__(model)
         self._base_size = base_size
+        self._pending: Future[Surface] | None = None
+
+    def model_updated(self):
+        super().model_updated()
+        self._pending = None
 
     def get_base_size(self) -> float:
         return self._base_size
@@ -21,7 +41,75 @@ class EntityView(BaseView):
     def set_base_size(self, base_size: float):
         if base_size != self._base_size:
             self._base_size = base_size
-            self._surface = None
+            self.model_updated()
+
+    def sprite_key(self) -> tuple:
+        return (
+            ImageUtils.image_key(self._model.image_path),
+            self._base_size * self._model.size,
+            self._model.shape)
+
+    def get_surface(self) -> Surface:
+        '''Shared between identical entities so it must not be modified'''
+        if not self.prepare():
+            assert self._pending is not None
+            self._surface = self._pending.result()
+            self._pending = None
+        assert self._surface is not None
+        return self._surface
+
+    def prepare(self) -> bool:
+        '''Start drawing the surface in the loader, return if it is ready'''
+        if self._surface is not None:
+            return True
+
+        if self._pending is None:
+            self._pending = self._request()
+        if not self._pending.done():
+            return False
+
+        self._surface = self._pending.result()
+        self._pending = None
+        return True
+
+    def _request(self) -> Future[Surface]:
+        key = self.sprite_key()
+        future = EntityView._drawing.get(key)
+        if future is not None:
+            return future
+
+        future = Future()
+        surface = EntityView._sprites.get(key)
+        if surface is not None:
+            future.set_result(surface)
+            return future
+
+        # The loader draws from a snapshot, the model may change meanwhile
+        snapshot = copy(self)
+        snapshot._model = copy(self._model)
+        future = SpriteLoader.submit(EntityView._draw_sprite, snapshot, key)
+        EntityView._drawing[key] = future
+        future.add_done_callback(lambda _: EntityView._drawing.pop(key, None))
+        return future
+
+    @staticmethod
+    def _draw_sprite(view: 'EntityView', key: tuple) -> Surface:
+        # The image key goes first, the drawing parameters after it
+        surface = SpriteCache.get(key[0], key[1:])
+        if surface is None:
+            surface = view.draw_surface()
+            SpriteCache.put(key[0], key[1:], surface)
+        EntityView._sprites.put(key, surface)
+        return surface
+
+    @staticmethod
+    def preload_sprite(key: tuple, surface: Surface):
+        '''Use surface for the views with the sprite_key key'''
+        EntityView._sprites.put(key, surface)
+
+    @staticmethod
+    def sprite_cache_stats() -> dict[str, int]:
+        return EntityView._sprites.stats()
 
     def draw_surface(self) -> Surface:
         cellsize = self._base_size * self._model.size
@@ -3,4 +3,4 @@ from gui.view.entity import EntityView
 
 
 class ItemView(EntityView):
-    ...
+    __slots__ = ()
@@ -3,12 +3,18 @@
 # from tkinter.messagebox import askquestion, askokcancel, askyesno, askyesnocancel, askretrycancel
 
 import os
+from argparse import ArgumentParser
 from tkinter.filedialog import askopenfilename, asksaveasfilename
+from tkinter.messagebox import askyesno
 
 import json
 from pathlib import Path
 
-from gui.files import ENCOUNTER_FILETYPES, IMAGE_FILETYPES, base_dir, encounter_dir
+from gui.files import (
+    BASE_DIR_ENV, BUNDLE_FILETYPES, ENCOUNTER_FILETYPES, IMAGE_FILETYPES,
+    autosave_path, base_dir, encounter_dir, init_dirs, journal_path)
+from gui.bundle import Bundle
+from gui.journal import Journal
 from gui.screen import Screen
 
 
@@ -17,13 +23,28 @@ def prepare_window_pos():
     os.environ['SDL_VIDEO_WINDOW_POS'] = f'{x},{y}'
 
 
-def main():
+def recover(file: Path, journal: Path, autosave: Path) -> bool:
+    '''Whether to replay the journal of a session that didn't end well'''
+    if not journal.exists() or not autosave.exists():
+        return False
+    last_change = max(
+        journal.stat().st_mtime, autosave.stat().st_mtime)
+    if file.exists() and file.stat().st_mtime > last_change:
+        return False
+    return askyesno(
+        title='Recover',
+        message=f'{file.stem} was not saved last time, recover the changes?')
+
+
+def main(home: str | None = None):
+    init_dirs(home)
 
     file = askopenfilename(
         title='Choose an encounter file or a background image',
         initialdir=base_dir(),
         filetypes=(
             ('Encounter', ENCOUNTER_FILETYPES),
+            ('Encounter bundle', BUNDLE_FILETYPES),
             ('Background image', IMAGE_FILETYPES),
         ))
     if not file:
@@ -32,9 +53,17 @@ def main():
 
     prepare_window_pos()
     Screen.init()
-    from_encounter = file.suffix in ENCOUNTER_FILETYPES or not file.suffix
+    from_bundle = bool(file.suffix) and file.suffix in BUNDLE_FILETYPES
+    from_encounter = (
+        file.suffix in ENCOUNTER_FILETYPES or not file.suffix or from_bundle)
 
-    if from_encounter:
+    autosave = autosave_path(file)
+    journal = journal_path(file)
+    if recover(file, journal, autosave):
+        screen = Screen(Journal.replay(journal, autosave))
+    elif from_bundle:
+        screen = Screen(Bundle.load(file))
+    elif from_encounter:
         with file.open('r') as f:
             string = f.read()
         data = json.loads(string)
@@ -43,34 +72,56 @@ def main():
         screen = Screen.from_image(file)
 
     print(screen.encounter.to_dict())
+    screen.journal = Journal(journal, screen.encounter, autosave)
     try:
-        screen.loop()
+        try:
+            screen.loop()
+        finally:
+            screen.journal.close()
+        # Before closing the screen, bundles draw the missing sprites
+        save(screen, file, from_encounter)
     finally:
         Screen.close()
 
+
+def save(screen: Screen, file: Path, from_encounter: bool):
     datas = json.dumps(screen.encounter.to_dict())
     print(datas)
+    filetypes = (
+        ('Encounter', ENCOUNTER_FILETYPES),
+        ('Encounter bundle', BUNDLE_FILETYPES),
+    )
     MAX_ITERATIONS = 10
     for _ in range(MAX_ITERATIONS):
         if from_encounter:
             save_as = asksaveasfilename(
                 title='Save as',
-                filetypes=(('Encounter', ENCOUNTER_FILETYPES), ),
+                filetypes=filetypes,
                 initialfile=file.name,
                 initialdir=file.parent,
             )
         else:
             save_as = asksaveasfilename(
                 title='Save as',
-                filetypes=(('Encounter', ENCOUNTER_FILETYPES), ),
+                filetypes=filetypes,
                 initialdir=encounter_dir(),
             )
         if save_as:
-            save_as = Path(save_as).with_suffix('.json')
-            with save_as.open('w') as f:
-                f.write(datas)
+            save_as = Path(save_as)
+            if save_as.suffix and save_as.suffix in BUNDLE_FILETYPES:
+                Bundle.save(screen.encounter, save_as)
+            else:
+                with save_as.with_suffix('.json').open('w') as f:
+                    f.write(datas)
+            screen.journal.discard()
         break
 
 
 if __name__ == '__main__':
-    main()
+    parser = ArgumentParser(description='TTRPG encounter manager')
+    parser.add_argument(
+        '--home', default=None,
+        help=(
+            'directory for images and encounters, by default '
+            f'${BASE_DIR_ENV} or ~/.encountermanager'))
+    main(parser.parse_args().home)